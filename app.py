@@ -4,16 +4,27 @@ Flask Backend API for Skin Cancer Detection
 
 from flask import Flask, request, jsonify, render_template, session, redirect, url_for
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
 import os
-import json
+import uuid
+import threading
 from PIL import Image
 import numpy as np
 
 from model.model_utils import SkinCancerDetector
+from model.model_registry import ModelRegistry
+from model.inference_server import RemoteDetector
 from utils.image_validation import validate_image_quality
+from utils.image_preflight import preflight_image, ALLOWED_FORMATS, MAX_IMAGE_PIXELS
+from utils.decoded_image import DecodedImage
+from utils.prediction_cache import PredictionCache
+from utils.validation_pool import ValidationPool, ValidationPoolSaturated, fork_available
+from utils.history_store import HistoryStore, project
+from utils.knowledge_cache import KnowledgeCache
+from utils.user_store import UserStore, DuplicateUserError
+from utils.password_hasher import PasswordHasher, PasswordHasherSaturated
 
 app = Flask(__name__)
 CORS(app)
@@ -25,60 +36,149 @@ app.config['SECRET_KEY'] = 'skin-saviour-secret-key-2024-change-in-production'
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'bmp'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+# MAX_IMAGE_PIXELS (utils.image_preflight): larger images are rejected from the header alone
+
+# Uploads are processed in memory. Set to 'all' to keep every upload or
+# 'rejected' to keep only images that fail validation (for debugging).
+UPLOAD_RETENTION = None
+
+# Validate large uploads on a downscaled proxy (long edge in pixels, e.g. 512).
+# None validates at full resolution. See benchmark_validation.py.
+VALIDATION_PROXY_EDGE = None
+
+# Stop validating /api/predict uploads at the first rejecting check (blur)
+# instead of also computing brightness and lesion statistics. Blur is first
+# estimated on full-resolution tiles and only borderline scores are measured
+# on the whole image. /api/validate always runs every check at full resolution.
+VALIDATION_EARLY_EXIT = True
+
+# Run validation in worker processes (0 = inline in the request thread).
+# Requests beyond VALIDATION_MAX_PENDING in-flight validations get a 503.
+# Workers are forked, so on platforms without fork (Windows) validation
+# stays inline.
+VALIDATION_WORKERS = 0
+VALIDATION_MAX_PENDING = 8
+
+if VALIDATION_WORKERS and not fork_available():
+    print("VALIDATION_WORKERS ignored: validation worker processes need fork, "
+          "which this platform does not support. Validating inline.")
+    VALIDATION_WORKERS = 0
+
+# Created before the model is loaded so forked workers don't inherit it
+validation_pool = ValidationPool(VALIDATION_WORKERS, VALIDATION_MAX_PENDING) if VALIDATION_WORKERS else None
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
+app.config['MAX_IMAGE_PIXELS'] = MAX_IMAGE_PIXELS
+app.config['UPLOAD_RETENTION'] = UPLOAD_RETENTION
 
-# Create upload directory
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-# User storage file (simple file-based storage for demo)
-USERS_FILE = 'users.json'
-HISTORY_FILE = 'prediction_history.json'
+# User storage (SQLite); the old users.json is imported on first start
+USERS_DB = 'users.db'
+USERS_FILE = 'users.json'  # Legacy format
+HISTORY_FILE = 'prediction_history.json'  # Legacy format, migrated on first start
+HISTORY_LOG = 'prediction_history.jsonl'
 KNOWLEDGE_FILE = 'medical_knowledge.json'
 
-# Initialize detector
-detector = SkinCancerDetector()
+# Knowledge endpoints are encoded once and revalidated by ETag
+KNOWLEDGE_CACHE_MAX_AGE = 300  # seconds
+knowledge_cache = KnowledgeCache(dumps=app.json.dumps)
 
-# Helper functions for user management
-def load_users():
-    """Load users from file"""
-    if os.path.exists(USERS_FILE):
-        try:
-            with open(USERS_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
-
-def save_users(users):
-    """Save users to file"""
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=2)
-
-def load_prediction_history():
-    """Load prediction history from file"""
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+user_store = UserStore(USERS_DB, legacy_path=USERS_FILE)
+
+# Password hashing runs on its own bounded pool so login bursts use at most
+# PASSWORD_HASH_WORKERS cores; beyond PASSWORD_HASH_MAX_PENDING queued
+# hashes auth requests get a 503. PASSWORD_HASH_METHOD sets the KDF cost of
+# new hashes (werkzeug method string, e.g. 'pbkdf2:sha256:600000').
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_MAX_PENDING = 64
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+password_hasher = PasswordHasher(
+    max_workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING, method=PASSWORD_HASH_METHOD
+)
+
+# Append-only prediction history
+history_store = HistoryStore(HISTORY_LOG, legacy_path=HISTORY_FILE)
+
+# Micro-batching: group concurrent /api/predict calls into one model call
+BATCH_INFERENCE = False
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT_MS = 10
+
+# Speculative inference: run the CNN while the upload is still being
+# validated and discard the result if validation rejects it. Latency becomes
+# max(validation, inference) instead of their sum, at the cost of wasted
+# inference on rejected uploads.
+SPECULATIVE_INFERENCE = False
+SPECULATIVE_WORKERS = 4
+speculation_executor = ThreadPoolExecutor(
+    max_workers=SPECULATIVE_WORKERS, thread_name_prefix='speculative-inference'
+) if SPECULATIVE_INFERENCE else None
+
+# Inference backend: 'keras' (.h5) or 'tflite' (see model/export_model.py)
+MODEL_BACKEND = 'keras'
+
+# Build an untrained model (downloading ImageNet weights) if the file is missing
+MODEL_CREATE_IF_MISSING = True
+
+# Hot reload: watch a directory of versioned artifacts (e.g. 'model/versions')
+# and swap in the newest one without a restart. None uses only the default
+# model file. MODEL_RESIDENT_VERSIONS keeps earlier versions loaded; with
+# SHADOW_SCORING each prediction is also scored by them off the request path.
+MODEL_REGISTRY_DIR = None
+MODEL_REGISTRY_POLL_SECONDS = 10
+MODEL_RESIDENT_VERSIONS = 1
+SHADOW_SCORING = False
+
+# Shadow jobs queued or running at once; further predictions are not shadow
+# scored (counted as dropped) so a backlog cannot grow without limit
+SHADOW_MAX_PENDING = 4
+
+# Set by serve.py: web workers send inference to a shared process that owns
+# the model instead of each loading a copy
+INFERENCE_SOCKET = os.environ.get('SKIN_SAVIOUR_INFERENCE_SOCKET')
+INFERENCE_AUTHKEY = bytes.fromhex(os.environ.get('SKIN_SAVIOUR_INFERENCE_AUTHKEY', ''))
 
-def save_prediction_history(history):
-    """Save prediction history to file"""
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(history, f, indent=2)
+# Initialize detector. The model (and TensorFlow) loads on a background
+# thread so every non-inference route serves immediately; /api/ready
+# reports when inference is available.
+if INFERENCE_SOCKET:
+    detector = RemoteDetector(INFERENCE_SOCKET, authkey=INFERENCE_AUTHKEY or None)
+else:
+    detector = SkinCancerDetector(backend=MODEL_BACKEND, autoload=False, create_if_missing=MODEL_CREATE_IF_MISSING,
+                                  resident_versions=MODEL_RESIDENT_VERSIONS)
+    if BATCH_INFERENCE:
+        detector.enable_batching(max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
 
+# Cache of validation/prediction results keyed by image hash + model version
+PREDICTION_CACHE_SIZE = 1024
+PREDICTION_CACHE_TTL = 3600  # seconds
+prediction_cache = PredictionCache(max_entries=PREDICTION_CACHE_SIZE, ttl_seconds=PREDICTION_CACHE_TTL)
+detector.add_reload_listener(prediction_cache.invalidate)
+
+model_registry = None
+if not INFERENCE_SOCKET:  # Otherwise the inference process loads the model
+    if MODEL_REGISTRY_DIR:
+        model_registry = ModelRegistry(detector, MODEL_REGISTRY_DIR, poll_interval=MODEL_REGISTRY_POLL_SECONDS)
+        # The registry's first poll loads the newest artifact in the background
+        if model_registry.latest() is None:
+            detector.load_in_background()
+        model_registry.start()
+    else:
+        detector.load_in_background()
+
+shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow-scoring') if SHADOW_SCORING else None
+shadow_slots = threading.BoundedSemaphore(SHADOW_MAX_PENDING)
+shadow_stats = {}
+shadow_dropped = 0
+shadow_lock = threading.Lock()
+
+# Helper functions for user management
 def add_prediction_to_history(user_id, image_filename, prediction_result, image_metadata=None):
     """Add a new prediction to history"""
     from datetime import datetime
     
-    history = load_prediction_history()
-    
     prediction_entry = {
-        'prediction_id': f"pred_{len(history) + 1}_{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        'prediction_id': None,  # Assigned by the store
         'user_id': user_id,
         'timestamp': datetime.now().isoformat(),
         'image_filename': image_filename,
@@ -87,69 +187,41 @@ def add_prediction_to_history(user_id, image_filename, prediction_result, image_
         'risk_level': prediction_result.get('risk_level'),
         'is_cancerous': prediction_result.get('is_cancerous'),
         'probabilities': prediction_result.get('probabilities'),
+        'model_version': prediction_result.get('model_version'),
         'metadata': image_metadata or {}
     }
     
-    history.append(prediction_entry)
-    save_prediction_history(history)
-    
-    return prediction_entry['prediction_id']
+    return history_store.append(prediction_entry)
 
 def get_analytics_summary(user_id=None):
-    """Generate analytics summary from prediction history"""
-    history = load_prediction_history()
-    
-    if user_id:
-        history = [p for p in history if p.get('user_id') == user_id]
-    
-    if not history:
-        return {
-            'total_predictions': 0,
-            'high_risk_count': 0,
-            'medium_risk_count': 0,
-            'low_risk_count': 0,
-            'condition_distribution': {},
-            'recent_predictions': []
-        }
-    
-    analytics = {
-        'total_predictions': len(history),
-        'high_risk_count': sum(1 for p in history if p.get('risk_level') == 'High'),
-        'medium_risk_count': sum(1 for p in history if p.get('risk_level') == 'Medium'),
-        'low_risk_count': sum(1 for p in history if p.get('risk_level') == 'Low'),
-        'condition_distribution': {},
-        'recent_predictions': sorted(history, key=lambda x: x.get('timestamp', ''), reverse=True)[:5]
-    }
-    
-    for prediction in history:
-        condition = prediction.get('condition', 'Unknown')
-        analytics['condition_distribution'][condition] = analytics['condition_distribution'].get(condition, 0) + 1
-    
-    return analytics
+    """Generate analytics summary from the running history aggregates"""
+    return history_store.summary(user_id)
 
 def load_medical_knowledge():
-    """Load medical knowledge base"""
-    if os.path.exists(KNOWLEDGE_FILE):
-        try:
-            with open(KNOWLEDGE_FILE, 'r') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    """Load medical knowledge base (parsed once, re-read when the file changes; read-only)"""
+    return knowledge_cache.load_json(KNOWLEDGE_FILE)
+
+def knowledge_response(payload):
+    """
+    Serve a pre-serialized knowledge payload with a strong ETag
+    
+    Clients revalidate with If-None-Match and get an empty 304 when the
+    content has not changed.
+    """
+    response = app.response_class(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = KNOWLEDGE_CACHE_MAX_AGE
+    return response.make_conditional(request)
 
 def init_default_user():
     """Initialize default user for demo"""
-    users = load_users()
-    if not users:
+    if len(user_store) == 0:
         # Create default user: username: admin, password: admin123
-        users = {
-            'admin': {
-                'username': 'admin',
-                'email': 'admin@skinsaviour.com',
-                'password': generate_password_hash('admin123')
-            }
-        }
-        save_users(users)
+        try:
+            user_store.add('admin', 'admin@skinsaviour.com', password_hasher.hash('admin123'))
+        except DuplicateUserError:
+            return  # Another worker created it first
         print("Default user created: username='admin', password='admin123'")
 
 # Initialize default user on startup
@@ -169,6 +241,113 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def preflight_upload(file):
+    """
+    Check an upload's header before any pixels are decoded
+    
+    The file extension is only a hint; the format is taken from the header.
+    
+    Returns:
+        (response, status) tuple if the upload is rejected, None otherwise
+    """
+    preflight = preflight_image(
+        file.stream, max_pixels=app.config['MAX_IMAGE_PIXELS'], allowed_formats=ALLOWED_FORMATS
+    )
+    if preflight['is_valid']:
+        return None
+    return jsonify({
+        'error': 'Image rejected',
+        'details': preflight['errors'],
+        'warnings': []
+    }), 400
+
+def shadow_score(prepared, primary_result):
+    """
+    Score a prepared image with every other resident model version and record agreement
+    
+    Reuses the primary request's prepare() output, so only the CNN runs per version.
+    """
+    try:
+        for version in detector.versions()['resident']:
+            if version == primary_result.get('model_version'):
+                continue
+            try:
+                shadow_result = detector.predict(None, prepared=prepared, version=version)
+            except ValueError:
+                continue  # Evicted since versions() was read
+            with shadow_lock:
+                stats = shadow_stats.setdefault(version, {'compared': 0, 'agreed': 0})
+                stats['compared'] += 1
+                stats['agreed'] += shadow_result['predicted_class'] == primary_result['predicted_class']
+    finally:
+        shadow_slots.release()
+
+def submit_shadow_score(prepared, primary_result):
+    """Queue shadow scoring unless SHADOW_MAX_PENDING jobs are already waiting"""
+    global shadow_dropped
+    if not shadow_slots.acquire(blocking=False):
+        with shadow_lock:
+            shadow_dropped += 1
+        return
+    try:
+        shadow_executor.submit(shadow_score, prepared, primary_result)
+    except Exception:
+        shadow_slots.release()
+        raise
+
+def prepare_and_predict(image):
+    """prepare() then predict(), returning both so the prepared input can be reused"""
+    prepared = detector.prepare(image)
+    return prepared, detector.predict(image, prepared=prepared)
+
+def auth_busy_response():
+    """503 returned when the password hashing queue is full"""
+    return jsonify({
+        'success': False,
+        'message': 'Too many sign-in attempts right now. Please try again shortly.'
+    }), 503, {'Retry-After': '1'}
+
+def model_loading_response():
+    """503 returned while the model is still loading in the background"""
+    return jsonify({
+        'error': 'Model is still loading. Please try again shortly.',
+        'details': detector.load_error
+    }), 503, {'Retry-After': '5'}
+
+def busy_response():
+    """503 returned when the validation pool is saturated"""
+    return jsonify({
+        'error': 'Server is busy. Please try again shortly.'
+    }), 503, {'Retry-After': '1'}
+
+def read_upload(file):
+    """Read an uploaded file stream into memory once"""
+    file.stream.seek(0)
+    return file.stream.read()
+
+def retain_upload(image_bytes, filename, outcome):
+    """
+    Write an upload to UPLOAD_FOLDER if the retention policy asks for it
+    
+    Args:
+        image_bytes: Encoded image bytes
+        filename: Sanitized original filename
+        outcome: 'accepted' or 'rejected'
+    
+    Returns:
+        Path of the retained file, or None if nothing was written
+    """
+    policy = app.config.get('UPLOAD_RETENTION')
+    if policy not in ('all', outcome):
+        return None
+    
+    # Prefix with a random id so concurrent uploads of the same name don't collide
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4().hex}_{filename}")
+    with open(filepath, 'wb') as f:
+        f.write(image_bytes)
+    return filepath
+
 @app.route('/')
 @login_required
 def index():
@@ -246,17 +425,15 @@ def api_login():
                 'message': 'Username and password are required'
             }), 400
         
-        users = load_users()
+        user = user_store.get(username)
         
-        if username not in users:
+        if user is None:
             return jsonify({
                 'success': False,
                 'message': 'Invalid username or password'
             }), 401
         
-        user = users[username]
-        
-        if not check_password_hash(user['password'], password):
+        if not password_hasher.check(user['password'], password):
             return jsonify({
                 'success': False,
                 'message': 'Invalid username or password'
@@ -274,6 +451,8 @@ def api_login():
             'redirect': '/dashboard'
         }), 200
     
+    except PasswordHasherSaturated:
+        return auth_busy_response()
     except Exception as e:
         return jsonify({
             'success': False,
@@ -301,35 +480,35 @@ def api_register():
                 'message': 'Password must be at least 6 characters long'
             }), 400
         
-        users = load_users()
-        
-        if username in users:
+        if user_store.get(username) is not None:
             return jsonify({
                 'success': False,
                 'message': 'Username already exists'
             }), 400
         
         # Check if email already exists
-        for user in users.values():
-            if user.get('email') == email:
-                return jsonify({
-                    'success': False,
-                    'message': 'Email already registered'
-                }), 400
+        if user_store.get_by_email(email) is not None:
+            return jsonify({
+                'success': False,
+                'message': 'Email already registered'
+            }), 400
         
-        # Create new user
-        users[username] = {
-            'username': username,
-            'email': email,
-            'password': generate_password_hash(password)
-        }
-        save_users(users)
+        # Create new user; the unique indexes also catch concurrent signups
+        try:
+            user_store.add(username, email, password_hasher.hash(password))
+        except DuplicateUserError as e:
+            return jsonify({
+                'success': False,
+                'message': 'Email already registered' if e.field == 'email' else 'Username already exists'
+            }), 400
         
         return jsonify({
             'success': True,
             'message': 'Account created successfully'
         }), 201
     
+    except PasswordHasherSaturated:
+        return auth_busy_response()
     except Exception as e:
         return jsonify({
             'success': False,
@@ -359,6 +538,37 @@ def health_check():
         'message': 'Skin Saviour API is running'
     })
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness endpoint: 200 once the model is loaded and warmed up, 503 before"""
+    ready = detector.is_ready()
+    return jsonify({
+        'ready': ready,
+        'model_version': detector.model_version if ready else None,
+        'error': detector.load_error
+    }), 200 if ready else 503
+
+@app.route('/api/inference-metrics', methods=['GET'])
+def inference_metrics():
+    """Batch-size distribution and queue wait times for the inference batcher"""
+    # In serve.py mode the batcher lives in the inference process, so the
+    # flag follows the (remote) metrics rather than the local detector
+    batching = detector.get_batching_metrics()
+    return jsonify({
+        'success': True,
+        'batching_enabled': batching is not None,
+        'batching': batching,
+        'prediction_cache': prediction_cache.get_stats(),
+        'validation_pool': validation_pool.get_metrics() if validation_pool is not None else None,
+        'models': model_registry.get_status() if model_registry is not None else detector.versions(),
+        'shadow_scoring': {
+            'versions': dict(shadow_stats),
+            'dropped': shadow_dropped,
+            'max_pending': SHADOW_MAX_PENDING
+        } if shadow_executor is not None else None,
+        'password_hashing': password_hasher.get_metrics()
+    }), 200
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
     """
@@ -369,6 +579,9 @@ def predict():
     - POST with 'image' file in form data
     """
     try:
+        if not detector.is_ready():
+            return model_loading_response()
+        
         # Check if image file is present
         if 'image' not in request.files:
             return jsonify({
@@ -387,17 +600,69 @@ def predict():
                 'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, BMP'
             }), 400
         
-        # Save uploaded file
+        rejection = preflight_upload(file)
+        if rejection is not None:
+            return rejection
+        
+        # Read the upload into memory; nothing touches disk unless retained
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        image_bytes = read_upload(file)
+        
+        # Identical bytes under the same model reuse earlier results
+        cache_key = PredictionCache.make_key(image_bytes, detector.model_version)
+        cached = prediction_cache.get(cache_key) or {}
+        validation_result = cached.get('validation')
+        prediction_result = cached.get('prediction')
+        
+        # Decode once; validation and inference share the pixel buffer. When
+        # validation is already cached the detector decodes the bytes itself.
+        image = None
+        if validation_result is None:
+            try:
+                image = DecodedImage.from_bytes(image_bytes)
+            except Exception as decode_error:
+                retain_upload(image_bytes, filename, 'rejected')
+                return jsonify({
+                    'error': 'Image quality validation failed',
+                    'details': [f'Error validating image: {str(decode_error)}'],
+                    'warnings': []
+                }), 400
+        
+        # Start inference speculatively; it reads the same buffer as validation
+        prediction_future = None
+        if speculation_executor is not None and validation_result is None and prediction_result is None:
+            prediction_future = speculation_executor.submit(prepare_and_predict, image)
         
         # Validate image quality
-        validation_result = validate_image_quality(filepath)
+        prepared = None
+        if validation_result is None and validation_pool is not None:
+            try:
+                validation_future = validation_pool.submit(
+                    image, proxy_max_edge=VALIDATION_PROXY_EDGE, stop_on_error=VALIDATION_EARLY_EXIT
+                )
+            except ValidationPoolSaturated:
+                if prediction_future is not None:
+                    prediction_future.cancel()
+                return busy_response()
+            # CNN preprocessing runs here while a worker validates the same image
+            if prediction_result is None and prediction_future is None:
+                try:
+                    prepared = detector.prepare(image)
+                except Exception:
+                    prepared = None  # predict() below reports the error
+            validation_result = validation_future.result()
+            prediction_cache.put(cache_key, validation=validation_result)
+        elif validation_result is None:
+            validation_result = validate_image_quality(
+                image, proxy_max_edge=VALIDATION_PROXY_EDGE, stop_on_error=VALIDATION_EARLY_EXIT
+            )
+            prediction_cache.put(cache_key, validation=validation_result)
         
         if not validation_result['is_valid']:
-            # Clean up uploaded file
-            os.remove(filepath)
+            # Discard the speculative inference (cancelled if it has not started)
+            if prediction_future is not None:
+                prediction_future.cancel()
+            retain_upload(image_bytes, filename, 'rejected')
             return jsonify({
                 'error': 'Image quality validation failed',
                 'details': validation_result['errors'],
@@ -405,21 +670,27 @@ def predict():
             }), 400
         
         # Make prediction using CNN
-        try:
-            prediction_result = detector.predict(filepath)
-        except Exception as pred_error:
-            # Clean up uploaded file
-            if os.path.exists(filepath):
-                os.remove(filepath)
-            import traceback
-            error_trace = traceback.format_exc()
-            print(f"Prediction error details: {error_trace}")
-            return jsonify({
-                'error': 'Prediction failed',
-                'message': f'Model prediction error: {str(pred_error)}',
-                'details': 'Please ensure the model is properly loaded and the image is valid.',
-                'traceback': error_trace if app.debug else None
-            }), 500
+        if prediction_result is None:
+            try:
+                if prediction_future is not None:
+                    prepared, prediction_result = prediction_future.result()
+                else:
+                    if prepared is None:
+                        prepared = detector.prepare(image if image is not None else image_bytes)
+                    prediction_result = detector.predict(None, prepared=prepared)
+            except Exception as pred_error:
+                import traceback
+                error_trace = traceback.format_exc()
+                print(f"Prediction error details: {error_trace}")
+                return jsonify({
+                    'error': 'Prediction failed',
+                    'message': f'Model prediction error: {str(pred_error)}',
+                    'details': 'Please ensure the model is properly loaded and the image is valid.',
+                    'traceback': error_trace if app.debug else None
+                }), 500
+            prediction_cache.put(cache_key, prediction=prediction_result)
+            if shadow_executor is not None:
+                submit_shadow_score(prepared, dict(prediction_result))
         
         # Add validation warnings to result
         if validation_result['warnings']:
@@ -428,14 +699,17 @@ def predict():
         # Add medical disclaimer
         prediction_result['disclaimer'] = 'This is an AI-based preliminary analysis and not a medical diagnosis.'
         
+        retained_path = retain_upload(image_bytes, filename, 'accepted')
+        if retained_path:
+            filename = os.path.basename(retained_path)
+        
         # Store prediction in history
         user_id = session.get('user_id', 'guest')
         image_metadata = {
             'original_filename': file.filename,
-            'file_size': len(file.read()),
+            'file_size': len(image_bytes),
             'validation_warnings': validation_result.get('warnings', [])
         }
-        file.seek(0)  # Reset file pointer after reading size
         
         try:
             prediction_id = add_prediction_to_history(
@@ -448,19 +722,12 @@ def predict():
         except Exception as storage_error:
             print(f"Warning: Failed to store prediction history: {storage_error}")
         
-        # Clean up uploaded file
-        os.remove(filepath)
-        
         return jsonify({
             'success': True,
             'prediction': prediction_result
         }), 200
     
     except Exception as e:
-        # Clean up file if it exists
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
-        
         import traceback
         error_details = traceback.format_exc()
         print(f"Error in prediction endpoint: {error_details}")
@@ -497,16 +764,42 @@ def validate():
                 'error': 'Invalid file type. Allowed: PNG, JPG, JPEG, GIF, BMP'
             }), 400
         
-        # Save uploaded file temporarily
+        rejection = preflight_upload(file)
+        if rejection is not None:
+            return rejection
+        
+        # Validate straight from the in-memory upload
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        image_bytes = read_upload(file)
         
-        # Validate image quality
-        validation_result = validate_image_quality(filepath)
+        cache_key = PredictionCache.make_key(image_bytes, detector.model_version)
+        cached = prediction_cache.get(cache_key)
+        # Early-exit results from /api/predict may lack the skipped diagnostics
+        # or carry a tile-sampled blur score; only reuse full checks
+        cached_validation = cached['validation'] if cached else None
+        if (cached_validation is not None and 'skipped_checks' not in cached_validation
+                and not cached_validation.get('blur_sampled')):
+            validation_result = cached_validation
+        elif validation_pool is not None:
+            try:
+                image = DecodedImage.from_bytes(image_bytes)
+            except Exception:
+                image = None
+            if image is None:
+                # Validated inline so the decode error is reported as usual
+                validation_result = validate_image_quality(image_bytes)
+            else:
+                try:
+                    validation_result = validation_pool.validate(image, proxy_max_edge=VALIDATION_PROXY_EDGE)
+                except ValidationPoolSaturated:
+                    return busy_response()
+            prediction_cache.put(cache_key, validation=validation_result)
+        else:
+            validation_result = validate_image_quality(image_bytes, proxy_max_edge=VALIDATION_PROXY_EDGE)
+            prediction_cache.put(cache_key, validation=validation_result)
         
-        # Clean up uploaded file
-        os.remove(filepath)
+        if not validation_result['is_valid']:
+            retain_upload(image_bytes, filename, 'rejected')
         
         return jsonify({
             'success': True,
@@ -514,14 +807,70 @@ def validate():
         }), 200
     
     except Exception as e:
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
-        
         return jsonify({
             'error': 'Validation failed',
             'message': str(e)
         }), 500
 
+# Static content for /api/medical-info, served pre-serialized from knowledge_cache
+MEDICAL_INFO = {
+    'skin_cancer': {
+        'title': 'Skin Cancer Information',
+        'what_is': 'Skin cancer is the abnormal growth of skin cells, most often developing on skin exposed to the sun. The three main types are basal cell carcinoma, squamous cell carcinoma, and melanoma.',
+        'early_symptoms': [
+            'New or changing moles or growths',
+            'Asymmetrical shape',
+            'Irregular borders',
+            'Varied colors',
+            'Diameter larger than 6mm',
+            'Evolving size, shape, or color'
+        ],
+        'importance': 'Early detection is crucial for successful treatment. Regular skin examinations and prompt medical attention can significantly improve outcomes.',
+        'recommendation': 'Please consult a dermatologist immediately for professional evaluation and diagnosis.'
+    },
+    'pimples': {
+        'title': 'Pimples / Acne Information',
+        'what_is': 'Pimples (acne) are a common skin condition that occurs when hair follicles become clogged with oil and dead skin cells. They typically appear as red, raised bumps on the skin.',
+        'causes': [
+            'Excess oil (sebum) production',
+            'Hair follicles clogged by oil and dead skin cells',
+            'Bacteria (Propionibacterium acnes)',
+            'Hormonal changes',
+            'Certain medications',
+            'Diet and stress'
+        ],
+        'skincare_tips': [
+            'Wash face twice daily with gentle cleanser',
+            'Avoid touching or picking at pimples',
+            'Use non-comedogenic (non-pore-clogging) products',
+            'Keep skin moisturized',
+            'Protect skin from sun exposure',
+            'Consider over-the-counter treatments with benzoyl peroxide or salicylic acid'
+        ],
+        'recommendation': 'For persistent or severe acne, consult a dermatologist for personalized treatment.'
+    },
+    'normal': {
+        'title': 'Normal Skin Care',
+        'what_is': 'Your skin appears healthy with no concerning lesions detected.',
+        'maintenance_tips': [
+            'Use sunscreen daily (SPF 30 or higher)',
+            'Stay hydrated',
+            'Eat a balanced diet rich in antioxidants',
+            'Avoid excessive sun exposure',
+            'Perform regular self-examinations',
+            'Keep skin clean and moisturized'
+        ],
+        'prevention': [
+            'Regular skin checks',
+            'Protect from UV radiation',
+            'Avoid tanning beds',
+            'Know your family history',
+            'Monitor changes in moles or skin growths'
+        ],
+        'recommendation': 'Continue maintaining healthy skin practices and consult a dermatologist for regular check-ups.'
+    }
+}
+
 @app.route('/api/medical-info', methods=['GET'])
 def medical_info():
     """
@@ -532,75 +881,18 @@ def medical_info():
     """
     condition = request.args.get('condition', '').lower()
     
-    info_data = {
-        'skin_cancer': {
-            'title': 'Skin Cancer Information',
-            'what_is': 'Skin cancer is the abnormal growth of skin cells, most often developing on skin exposed to the sun. The three main types are basal cell carcinoma, squamous cell carcinoma, and melanoma.',
-            'early_symptoms': [
-                'New or changing moles or growths',
-                'Asymmetrical shape',
-                'Irregular borders',
-                'Varied colors',
-                'Diameter larger than 6mm',
-                'Evolving size, shape, or color'
-            ],
-            'importance': 'Early detection is crucial for successful treatment. Regular skin examinations and prompt medical attention can significantly improve outcomes.',
-            'recommendation': 'Please consult a dermatologist immediately for professional evaluation and diagnosis.'
-        },
-        'pimples': {
-            'title': 'Pimples / Acne Information',
-            'what_is': 'Pimples (acne) are a common skin condition that occurs when hair follicles become clogged with oil and dead skin cells. They typically appear as red, raised bumps on the skin.',
-            'causes': [
-                'Excess oil (sebum) production',
-                'Hair follicles clogged by oil and dead skin cells',
-                'Bacteria (Propionibacterium acnes)',
-                'Hormonal changes',
-                'Certain medications',
-                'Diet and stress'
-            ],
-            'skincare_tips': [
-                'Wash face twice daily with gentle cleanser',
-                'Avoid touching or picking at pimples',
-                'Use non-comedogenic (non-pore-clogging) products',
-                'Keep skin moisturized',
-                'Protect skin from sun exposure',
-                'Consider over-the-counter treatments with benzoyl peroxide or salicylic acid'
-            ],
-            'recommendation': 'For persistent or severe acne, consult a dermatologist for personalized treatment.'
-        },
-        'normal': {
-            'title': 'Normal Skin Care',
-            'what_is': 'Your skin appears healthy with no concerning lesions detected.',
-            'maintenance_tips': [
-                'Use sunscreen daily (SPF 30 or higher)',
-                'Stay hydrated',
-                'Eat a balanced diet rich in antioxidants',
-                'Avoid excessive sun exposure',
-                'Perform regular self-examinations',
-                'Keep skin clean and moisturized'
-            ],
-            'prevention': [
-                'Regular skin checks',
-                'Protect from UV radiation',
-                'Avoid tanning beds',
-                'Know your family history',
-                'Monitor changes in moles or skin growths'
-            ],
-            'recommendation': 'Continue maintaining healthy skin practices and consult a dermatologist for regular check-ups.'
-        }
-    }
-    
-    if condition not in info_data:
+    if condition not in MEDICAL_INFO:
         return jsonify({
             'error': 'Invalid condition type',
-            'available_conditions': list(info_data.keys())
+            'available_conditions': list(MEDICAL_INFO.keys())
         }), 400
     
-    return jsonify({
+    payload = knowledge_cache.get(f'medical-info:{condition}', lambda: {
         'success': True,
         'condition': condition,
-        'information': info_data[condition]
-    }), 200
+        'information': MEDICAL_INFO[condition]
+    })
+    return knowledge_response(payload)
 
 @app.route('/api/nearby-doctors', methods=['GET'])
 def nearby_doctors_api():
@@ -684,6 +976,74 @@ def nearby_doctors_api():
             'message': str(e)
         }), 500
 
+# Static content for /api/medication-guidance, served pre-serialized from knowledge_cache
+MEDICATION_GUIDANCE = {
+    'skin_cancer': {
+        'title': 'Important Notice',
+        'message': 'Skin cancer requires professional medical treatment. Do not attempt self-medication.',
+        'recommendations': [
+            'Consult a certified dermatologist immediately',
+            'Follow medical professional advice',
+            'Do not use over-the-counter treatments for suspected cancer',
+            'Early professional intervention is critical'
+        ],
+        'disclaimer': 'This is not medical advice. Always consult a certified doctor before any treatment.'
+    },
+    'pimples': {
+        'title': 'Over-the-Counter Skincare Suggestions',
+        'message': 'For mild to moderate acne, consider these non-prescription options:',
+        'suggestions': [
+            {
+                'product_type': 'Benzoyl Peroxide',
+                'strength': '2.5% - 10%',
+                'usage': 'Apply once or twice daily to affected areas',
+                'note': 'May cause dryness, start with lower concentration'
+            },
+            {
+                'product_type': 'Salicylic Acid',
+                'strength': '0.5% - 2%',
+                'usage': 'Use as cleanser or spot treatment',
+                'note': 'Helps unclog pores and reduce inflammation'
+            },
+            {
+                'product_type': 'Retinoids (Adapalene)',
+                'strength': '0.1%',
+                'usage': 'Apply at night, start with every other day',
+                'note': 'Available over-the-counter, may cause initial irritation'
+            },
+            {
+                'product_type': 'Gentle Cleanser',
+                'usage': 'Wash face twice daily',
+                'note': 'Non-comedogenic, fragrance-free products recommended'
+            }
+        ],
+        'disclaimer': 'Medication guidance is informational only. Consult a certified doctor before use. Results may vary. Discontinue if irritation occurs.'
+    },
+    'normal': {
+        'title': 'Maintenance Skincare',
+        'message': 'For healthy skin maintenance:',
+        'suggestions': [
+            {
+                'product_type': 'Sunscreen',
+                'spf': 'SPF 30 or higher',
+                'usage': 'Apply daily, reapply every 2 hours if outdoors',
+                'note': 'Essential for skin cancer prevention'
+            },
+            {
+                'product_type': 'Moisturizer',
+                'usage': 'Apply daily to maintain skin barrier',
+                'note': 'Choose non-comedogenic products'
+            },
+            {
+                'product_type': 'Gentle Cleanser',
+                'usage': 'Wash face twice daily',
+                'note': 'Maintains skin health without over-drying'
+            }
+        ],
+        'disclaimer': 'These are general skincare recommendations. Consult a dermatologist for personalized advice.'
+    }
+}
+
 @app.route('/api/medication-guidance', methods=['GET'])
 def medication_guidance():
     """
@@ -694,102 +1054,71 @@ def medication_guidance():
     """
     condition = request.args.get('condition', '').lower()
     
-    guidance_data = {
-        'skin_cancer': {
-            'title': 'Important Notice',
-            'message': 'Skin cancer requires professional medical treatment. Do not attempt self-medication.',
-            'recommendations': [
-                'Consult a certified dermatologist immediately',
-                'Follow medical professional advice',
-                'Do not use over-the-counter treatments for suspected cancer',
-                'Early professional intervention is critical'
-            ],
-            'disclaimer': 'This is not medical advice. Always consult a certified doctor before any treatment.'
-        },
-        'pimples': {
-            'title': 'Over-the-Counter Skincare Suggestions',
-            'message': 'For mild to moderate acne, consider these non-prescription options:',
-            'suggestions': [
-                {
-                    'product_type': 'Benzoyl Peroxide',
-                    'strength': '2.5% - 10%',
-                    'usage': 'Apply once or twice daily to affected areas',
-                    'note': 'May cause dryness, start with lower concentration'
-                },
-                {
-                    'product_type': 'Salicylic Acid',
-                    'strength': '0.5% - 2%',
-                    'usage': 'Use as cleanser or spot treatment',
-                    'note': 'Helps unclog pores and reduce inflammation'
-                },
-                {
-                    'product_type': 'Retinoids (Adapalene)',
-                    'strength': '0.1%',
-                    'usage': 'Apply at night, start with every other day',
-                    'note': 'Available over-the-counter, may cause initial irritation'
-                },
-                {
-                    'product_type': 'Gentle Cleanser',
-                    'usage': 'Wash face twice daily',
-                    'note': 'Non-comedogenic, fragrance-free products recommended'
-                }
-            ],
-            'disclaimer': 'Medication guidance is informational only. Consult a certified doctor before use. Results may vary. Discontinue if irritation occurs.'
-        },
-        'normal': {
-            'title': 'Maintenance Skincare',
-            'message': 'For healthy skin maintenance:',
-            'suggestions': [
-                {
-                    'product_type': 'Sunscreen',
-                    'spf': 'SPF 30 or higher',
-                    'usage': 'Apply daily, reapply every 2 hours if outdoors',
-                    'note': 'Essential for skin cancer prevention'
-                },
-                {
-                    'product_type': 'Moisturizer',
-                    'usage': 'Apply daily to maintain skin barrier',
-                    'note': 'Choose non-comedogenic products'
-                },
-                {
-                    'product_type': 'Gentle Cleanser',
-                    'usage': 'Wash face twice daily',
-                    'note': 'Maintains skin health without over-drying'
-                }
-            ],
-            'disclaimer': 'These are general skincare recommendations. Consult a dermatologist for personalized advice.'
-        }
-    }
-    
-    if condition not in guidance_data:
+    if condition not in MEDICATION_GUIDANCE:
         return jsonify({
             'error': 'Invalid condition type',
-            'available_conditions': list(guidance_data.keys())
+            'available_conditions': list(MEDICATION_GUIDANCE.keys())
         }), 400
     
-    return jsonify({
+    payload = knowledge_cache.get(f'medication-guidance:{condition}', lambda: {
         'success': True,
         'condition': condition,
-        'guidance': guidance_data[condition]
-    }), 200
+        'guidance': MEDICATION_GUIDANCE[condition]
+    })
+    return knowledge_response(payload)
 
 @app.route('/api/prediction-history', methods=['GET'])
 def get_prediction_history():
-    """Get prediction history for the current user"""
+    """
+    Get prediction history for the current user (newest first)
+    
+    Query params:
+    - limit: Maximum number of predictions to return (default: all)
+    - cursor: next_cursor value from the previous page
+    - before: Only predictions older than this ISO timestamp
+    - fields: Comma-separated fields to return, e.g. 'prediction_id,timestamp,condition'
+    """
     try:
         user_id = session.get('user_id', 'guest')
-        history = load_prediction_history()
         
-        # Filter by user
-        user_history = [p for p in history if p.get('user_id') == user_id]
+        limit = request.args.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                return jsonify({
+                    'success': False,
+                    'error': 'limit must be a positive integer'
+                }), 400
         
-        # Sort by timestamp (newest first)
-        user_history = sorted(user_history, key=lambda x: x.get('timestamp', ''), reverse=True)
+        fields = request.args.get('fields')
+        if fields:
+            fields = [field.strip() for field in fields.split(',') if field.strip()]
+        else:
+            fields = None
+        
+        # Only the requested slice is read, straight from the per-user index
+        try:
+            user_history, next_cursor = history_store.page_for_user(
+                user_id,
+                limit=limit,
+                before=request.args.get('before'),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
         return jsonify({
             'success': True,
             'count': len(user_history),
-            'predictions': user_history
+            'total': history_store.count_for_user(user_id),
+            'next_cursor': next_cursor,
+            'predictions': [project(p, fields) for p in user_history]
         }), 200
     except Exception as e:
         return jsonify({
@@ -830,11 +1159,12 @@ def get_condition_info(condition):
                 'available_conditions': list(conditions.keys())
             }), 404
         
-        return jsonify({
+        payload = knowledge_cache.get(f'condition-info:{condition_lower}', lambda: {
             'success': True,
             'condition': condition_lower,
             'information': conditions[condition_lower]
-        }), 200
+        }, source=KNOWLEDGE_FILE)
+        return knowledge_response(payload)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -845,9 +1175,7 @@ def get_condition_info(condition):
 def get_prediction_detail(prediction_id):
     """Get details of a specific prediction"""
     try:
-        history = load_prediction_history()
-        
-        prediction = next((p for p in history if p.get('prediction_id') == prediction_id), None)
+        prediction = history_store.get(prediction_id)
         
         if not prediction:
             return jsonify({
@@ -880,10 +1208,6 @@ def get_dashboard_stats():
         user_id = session.get('user_id', 'guest')
         analytics = get_analytics_summary(user_id)
         
-        # Calculate additional statistics
-        history = load_prediction_history()
-        user_history = [p for p in history if p.get('user_id') == user_id]
-        
         stats = {
             'total_scans': analytics['total_predictions'],
             'high_risk_count': analytics['high_risk_count'],
@@ -905,7 +1229,7 @@ def get_dashboard_stats():
 
 if __name__ == '__main__':
     print("Starting Skin Saviour API...")
-    print("Model loaded:", detector.model is not None)
+    print("Model loading in the background; GET /api/ready reports when inference is available")
     print("Multi-class classification: Normal, Pimples, Skin Cancer")
     app.run(debug=True, host='0.0.0.0', port=5000)
 
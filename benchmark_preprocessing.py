@@ -0,0 +1,147 @@
+"""
+Check the draft_decode setting on the inference request path
+Times prepare() on a shared DecodedImage and on encoded bytes (the two ways
+predict() is called) and compares input tensors, visual features and, when
+a model is available (the backend's default artifact unless --no-model),
+end-to-end predict() outputs against full-resolution preprocessing
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from model.model_utils import SkinCancerDetector, DEFAULT_MODEL_PATHS
+from utils.decoded_image import DecodedImage
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def load_encoded_images(image_dir):
+    """Read every image under image_dir as encoded bytes"""
+    images = []
+    for root, _, files in os.walk(image_dir):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with open(os.path.join(root, name), 'rb') as f:
+                    images.append((name, f.read()))
+    return images
+
+def synthetic_jpegs(count=8, seed=0):
+    """Smooth phone-sized JPEGs with sensor-like noise for when no folder is given"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        width, height = [(4000, 3000), (3000, 4000), (2048, 1536), (1600, 1200)][i % 4]
+        coarse = Image.fromarray(rng.integers(90, 200, (height // 50, width // 50, 3), dtype=np.uint8))
+        img = np.asarray(coarse.resize((width, height), Image.BICUBIC), dtype=np.float32)
+        # Heavier noise is where reduced-scale decoding flattens texture most
+        noise = (4, 24, 40)[i % 3]
+        img = np.clip(img + rng.normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(img).save(buf, 'JPEG', quality=90)
+        images.append((f"synthetic_{i}.jpg", buf.getvalue()))
+    return images
+
+def timed(fn, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        result = fn()
+    return (time.perf_counter() - started) / repeats, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Check draft_decode preprocessing against full-resolution preprocessing')
+    parser.add_argument('image_dir', nargs='?', help='Folder of test images (default: synthetic JPEGs)')
+    parser.add_argument('--model', help='Model file (default: the backend\'s default artifact, if present)')
+    parser.add_argument('--no-model', action='store_true', help='Skip the end-to-end predict() comparison')
+    parser.add_argument('--backend', default='keras', choices=['keras', 'tflite'])
+    parser.add_argument('--tolerance', type=float, default=0.02, help='Max allowed probability difference')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    images = load_encoded_images(args.image_dir) if args.image_dir else synthetic_jpegs()
+    if not images:
+        print(f"No images found in '{args.image_dir}'")
+        return 0
+
+    if args.no_model:
+        args.model = None
+    elif args.model is None and os.path.exists(DEFAULT_MODEL_PATHS[args.backend]):
+        args.model = DEFAULT_MODEL_PATHS[args.backend]
+
+    full = SkinCancerDetector(args.model, backend=args.backend, draft_decode=False, autoload=False)
+    draft = SkinCancerDetector(args.model, backend=args.backend, draft_decode=True, autoload=False)
+    if args.model:
+        full.load_model()
+        draft._active = full._active  # Share one loaded model
+
+    totals = {'full_decoded': 0.0, 'draft_decoded': 0.0, 'full_bytes': 0.0, 'draft_bytes': 0.0}
+    tensor_diffs = []
+    prob_diffs = []
+    class_agree = 0
+    feature_mismatches = 0
+    for name, data in images:
+        # The two request paths: app.py passes its shared full decode, while
+        # cached validations and library callers pass the encoded bytes
+        decoded = DecodedImage.from_bytes(data)
+        times = {}
+        times['full_decoded'], full_prepared = timed(lambda: full.prepare(decoded), args.repeats)
+        times['draft_decoded'], _ = timed(lambda: draft.prepare(decoded), args.repeats)
+        times['full_bytes'], _ = timed(lambda: full.prepare(data), args.repeats)
+        times['draft_bytes'], draft_prepared = timed(lambda: draft.prepare(data), args.repeats)
+        for key, value in times.items():
+            totals[key] += value
+        tensor_diffs.append(float(np.abs(full_prepared['processed_image'] - draft_prepared['processed_image']).max()))
+        line = (f"{name:24s} decoded: full {times['full_decoded'] * 1000:7.1f} ms draft "
+                f"{times['draft_decoded'] * 1000:7.1f} ms  bytes: full {times['full_bytes'] * 1000:7.1f} ms draft "
+                f"{times['draft_bytes'] * 1000:7.1f} ms  max pixel diff {tensor_diffs[-1] * 255:4.1f}/255")
+
+        # Visual features must not depend on how the image reached predict()
+        full_features = full_prepared['visual_features']
+        draft_features = draft_prepared['visual_features']
+        features_match = (full_features['cancer_indicators'] == draft_features['cancer_indicators']
+                          and full_features['suggests_cancer'] == draft_features['suggests_cancer'])
+        feature_mismatches += not features_match
+        line += "" if features_match else (f"  FEATURES {full_features['cancer_indicators']}"
+                                           f"->{draft_features['cancer_indicators']}")
+
+        if args.model:
+            full_result = full.predict(decoded)
+            draft_result = draft.predict(data)
+            diff = max(abs(full_result['raw_probabilities'][k] - draft_result['raw_probabilities'][k])
+                       for k in full_result['raw_probabilities'])
+            prob_diffs.append(diff)
+            class_agree += full_result['predicted_class'] == draft_result['predicted_class']
+            line += f"  prob diff {diff:.4f}"
+        print(line)
+
+    count = len(images)
+    print(f"\nImages: {count}")
+    for path in ('decoded', 'bytes'):
+        full_mean = totals[f'full_{path}'] * 1000 / count
+        draft_mean = totals[f'draft_{path}'] * 1000 / count
+        print(f"Mean prepare() on {path}: full {full_mean:.1f} ms, draft {draft_mean:.1f} ms "
+              f"(speedup {full_mean / max(draft_mean, 1e-9):.2f}x)")
+    print(f"Max input pixel diff: {max(tensor_diffs) * 255:.1f}/255")
+    print(f"Visual feature mismatches: {feature_mismatches}/{count}")
+    if feature_mismatches:
+        print("FAIL: visual features depend on the decode path")
+        return 1
+
+    if not args.model:
+        print("No model available; pass --model to compare predict() outputs against the tolerance.")
+        return 0
+
+    print(f"Predicted class agreement: {class_agree / count:.1%}")
+    print(f"Max probability diff: {max(prob_diffs):.4f} (tolerance {args.tolerance})")
+    if max(prob_diffs) > args.tolerance:
+        print("FAIL: draft decoding changes model outputs beyond tolerance")
+        return 1
+    print("OK: draft decoding is within tolerance")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
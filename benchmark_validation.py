@@ -0,0 +1,114 @@
+"""
+Benchmark proxy (downscaled) validation against full-resolution validation
+Reports decision agreement, per-statistic drift and speedup
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from utils.decoded_image import DecodedImage
+from utils.image_validation import PROXY_MAX_EDGE, compute_image_statistics, validate_image_quality
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+def load_images(image_dir):
+    """Decode every image under image_dir"""
+    images = []
+    for root, _, files in os.walk(image_dir):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append((name, DecodedImage.from_path(os.path.join(root, name))))
+    return images
+
+def synthetic_images(count=20, seed=0):
+    """Phone-sized synthetic skin images (some blurred) for when no folder is given"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        height, width = [(3000, 4000), (1536, 2048), (1200, 1600), (768, 1024)][i % 4]
+        img = np.empty((height, width, 3), dtype=np.float32)
+        img[:] = (185, 145, 125)
+        for _ in range(int(rng.integers(5, 40))):
+            center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+            radius = int(rng.integers(height // 80, height // 10))
+            color = tuple(float(c) for c in rng.integers(40, 220, 3))
+            cv2.circle(img, center, radius, color, -1)
+        img += rng.normal(0, rng.uniform(2, 8), img.shape).astype(np.float32)
+        sigma = float(rng.choice([0, 0, 1, 3, 6])) * height / 1000.0
+        if sigma:
+            img = cv2.GaussianBlur(img, (0, 0), sigma)
+        images.append((f"synthetic_{i}", DecodedImage(np.clip(img, 0, 255).astype(np.uint8))))
+    return images
+
+DRIFT_KEYS = ('blur_score', 'brightness', 'std_dev', 'edge_density', 'hue_std', 'saturation_std')
+
+def time_call(fn, image, repeats):
+    """Mean time of fn on a fresh DecodedImage, so lazy conversions are counted"""
+    elapsed = 0.0
+    for _ in range(repeats):
+        fresh = DecodedImage(image.rgb)
+        started = time.perf_counter()
+        result = fn(fresh)
+        elapsed += time.perf_counter() - started
+    return elapsed / repeats, result
+
+def benchmark(images, max_edge, repeats):
+    """Compare full-resolution and proxy validation image by image"""
+    totals = {'full': 0.0, 'proxy': 0.0}
+    agree = {'is_valid': 0, 'has_lesion': 0, 'warnings': 0}
+    drift = {key: [] for key in DRIFT_KEYS}
+
+    for name, image in images:
+        full_time, full = time_call(validate_image_quality, image, repeats)
+        proxy_time, proxy = time_call(
+            lambda fresh: validate_image_quality(fresh, proxy_max_edge=max_edge), image, repeats
+        )
+        totals['full'] += full_time
+        totals['proxy'] += proxy_time
+
+        agree['is_valid'] += full['is_valid'] == proxy['is_valid']
+        agree['has_lesion'] += full['lesion_detection']['has_lesion'] == proxy['lesion_detection']['has_lesion']
+        agree['warnings'] += sorted(full['warnings']) == sorted(proxy['warnings'])
+
+        full_stats = compute_image_statistics(image)
+        proxy_stats = compute_image_statistics(image, proxy_max_edge=max_edge)
+        for key in DRIFT_KEYS:
+            if full_stats[key]:
+                drift[key].append(abs(proxy_stats[key] - full_stats[key]) / abs(full_stats[key]))
+
+        print(f"{name:30s} {image.width}x{image.height:<6d} "
+              f"full {full_time * 1000:7.1f} ms  proxy {proxy_time * 1000:6.1f} ms  "
+              f"blur {full['blur_score']:9.1f} / {proxy['blur_score']:9.1f}  "
+              f"valid {full['is_valid']!s:5s}/{proxy['is_valid']!s:5s}")
+
+    count = len(images)
+    print(f"\nImages: {count}, proxy long edge: {max_edge}px")
+    for key, value in agree.items():
+        print(f"Agreement on {key}: {value / count:.1%}")
+    print("Median relative drift of proxy statistics:")
+    for key, values in drift.items():
+        print(f"  {key:15s} {np.median(values) if values else 0.0:.1%}")
+    print(f"Mean validation time: full {totals['full'] * 1000 / count:.1f} ms, "
+          f"proxy {totals['proxy'] * 1000 / count:.1f} ms "
+          f"(speedup {totals['full'] / max(totals['proxy'], 1e-9):.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark proxy vs full-resolution image validation')
+    parser.add_argument('image_dir', nargs='?', help='Folder of test images (default: synthetic images)')
+    parser.add_argument('--max-edge', type=int, default=PROXY_MAX_EDGE, help='Proxy long edge in pixels')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per image')
+    args = parser.parse_args()
+
+    images = load_images(args.image_dir) if args.image_dir else synthetic_images()
+    if not images:
+        print(f"No images found in '{args.image_dir}'")
+        return
+
+    benchmark(images, args.max_edge, args.repeats)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Dynamic micro-batching for CNN inference
+Collects single-image requests from concurrent callers into one model call
+"""
+
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from utils.metrics import percentile_summary
+
+
+class BatchScheduler:
+    """
+    Queue preprocessed image tensors and run them through the model in batches
+
+    A batch is flushed as soon as it reaches max_batch_size, or when the
+    oldest queued request has waited max_wait_ms. Each caller receives its
+    own row of the model output.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, metrics_window=1000):
+        """
+        Args:
+            predict_fn: Callable mapping an (N, H, W, C) array to an (N, K) array
+            max_batch_size: Largest batch handed to predict_fn
+            max_wait_ms: Longest time a request waits for the batch to fill
+            metrics_window: Number of recent queue-wait samples kept for percentiles
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._running = True
+
+        self._metrics_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_waits = deque(maxlen=metrics_window)
+        self._total_requests = 0
+        self._total_batches = 0
+
+        self._worker = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, tensor):
+        """
+        Queue a single preprocessed image and wait for its prediction
+
+        Args:
+            tensor: One image of shape (H, W, C), without batch dimension
+
+        Returns:
+            The model output row for this image
+        """
+        return self.submit_async(tensor).result()
+
+    def submit_async(self, tensor):
+        """Queue a single preprocessed image and return a Future for its output row"""
+        future = Future()
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Batch scheduler has been stopped")
+            self._pending.append((tensor, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def _next_batch(self):
+        """Block until a batch is ready to flush, then pop it from the queue"""
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait()
+            if not self._pending:
+                return []
+
+            # Wait for the batch to fill up, but never past the oldest request's deadline
+            deadline = self._pending[0][2] + self.max_wait
+            while self._running and len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            try:
+                outputs = self.predict_fn(np.stack([item[0] for item in batch]))
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                outputs = None
+
+            if outputs is not None:
+                for row, (_, future, _) in zip(outputs, batch):
+                    future.set_result(row)
+
+            with self._metrics_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._total_batches += 1
+                self._total_requests += len(batch)
+                self._queue_waits.extend(started - enqueued for _, _, enqueued in batch)
+
+    def get_metrics(self):
+        """
+        Batch-size distribution and queue wait statistics
+
+        Returns:
+            Dictionary of counters and wait-time percentiles in milliseconds
+        """
+        with self._metrics_lock:
+            waits = np.array(self._queue_waits, dtype=np.float64) * 1000.0
+            metrics = {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'total_requests': self._total_requests,
+                'total_batches': self._total_batches,
+                'mean_batch_size': (self._total_requests / self._total_batches) if self._total_batches else 0.0,
+                'batch_size_distribution': {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                'queue_depth': len(self._pending)
+            }
+        metrics['queue_wait_ms'] = percentile_summary(waits)
+        return metrics
+
+    def stop(self):
+        """Flush queued requests and stop the worker thread"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._worker.join()
@@ -0,0 +1,173 @@
+"""
+Model Export Script for Skin Saviour
+Converts the Keras model to quantized TFLite artifacts (float16 and int8)
+and reports accuracy drift against the Keras model on a held-out folder
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+import tensorflow as tf
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.tflite_backend import TFLiteModel
+
+CLASS_NAMES = ['normal', 'pimples', 'skin_cancer']
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+def list_images(data_dir):
+    """
+    List images under data_dir with their class label (if in a class subfolder)
+
+    Returns:
+        List of (path, class_index or None) tuples
+    """
+    samples = []
+    for root, _, files in os.walk(data_dir):
+        label = os.path.basename(root)
+        class_index = CLASS_NAMES.index(label) if label in CLASS_NAMES else None
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                samples.append((os.path.join(root, name), class_index))
+    return samples
+
+def load_image_tensor(path, target_size=(224, 224)):
+    """Load an image the same way SkinCancerDetector.preprocess_image does"""
+    img = Image.open(path).convert('RGB').resize(target_size)
+    return np.array(img, dtype=np.float32) / 255.0
+
+def representative_dataset(samples, num_samples=100):
+    """Calibration generator for full-integer quantization"""
+    def generator():
+        if samples:
+            for path, _ in samples[:num_samples]:
+                yield [np.expand_dims(load_image_tensor(path), axis=0)]
+        else:
+            # No calibration images available; random data gives a rough range
+            rng = np.random.default_rng(42)
+            for _ in range(num_samples):
+                yield [rng.random((1, 224, 224, 3), dtype=np.float32)]
+    return generator
+
+def export_tflite(model, output_path, quantization, calibration_samples=None):
+    """
+    Convert a Keras model to TFLite
+
+    Args:
+        model: Loaded Keras model
+        output_path: Destination .tflite path
+        quantization: 'float16' or 'int8'
+        calibration_samples: (path, label) list used to calibrate int8 ranges
+
+    Returns:
+        Size of the written file in bytes
+    """
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        # Integer weights and activations; float32 input/output keep the API unchanged
+        converter.representative_dataset = representative_dataset(calibration_samples or [])
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    else:
+        raise ValueError(f"Unknown quantization '{quantization}'. Use 'float16' or 'int8'")
+
+    tflite_model = converter.convert()
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+    return len(tflite_model)
+
+def evaluate_drift(keras_model, tflite_path, samples):
+    """
+    Compare TFLite and Keras predictions on held-out images
+
+    Returns:
+        Dictionary with top-1 agreement, probability drift, per-image latency
+        and (for labelled images) accuracy of both models
+    """
+    tflite_model = TFLiteModel(tflite_path)
+    agree = 0
+    keras_correct = 0
+    tflite_correct = 0
+    labelled = 0
+    abs_diffs = []
+    keras_time = 0.0
+    tflite_time = 0.0
+
+    for path, label in samples:
+        batch = np.expand_dims(load_image_tensor(path), axis=0)
+
+        started = time.perf_counter()
+        keras_probs = keras_model(batch, training=False).numpy()[0]
+        keras_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        tflite_probs = tflite_model.predict(batch)[0]
+        tflite_time += time.perf_counter() - started
+
+        abs_diffs.append(np.abs(keras_probs - tflite_probs).max())
+        keras_class = int(np.argmax(keras_probs))
+        tflite_class = int(np.argmax(tflite_probs))
+        agree += keras_class == tflite_class
+        if label is not None:
+            labelled += 1
+            keras_correct += keras_class == label
+            tflite_correct += tflite_class == label
+
+    count = len(samples)
+    report = {
+        'images': count,
+        'top1_agreement': agree / count if count else None,
+        'mean_max_prob_diff': float(np.mean(abs_diffs)) if abs_diffs else None,
+        'max_prob_diff': float(np.max(abs_diffs)) if abs_diffs else None,
+        'keras_ms_per_image': keras_time * 1000 / count if count else None,
+        'tflite_ms_per_image': tflite_time * 1000 / count if count else None
+    }
+    if labelled:
+        report['keras_accuracy'] = keras_correct / labelled
+        report['tflite_accuracy'] = tflite_correct / labelled
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the Skin Saviour model to quantized TFLite')
+    parser.add_argument('--model', default='model/skin_cancer_model.h5', help='Keras model to export')
+    parser.add_argument('--output-dir', default='model', help='Directory for .tflite files')
+    parser.add_argument('--calibration-dir', default='data', help='Images used to calibrate int8 ranges')
+    parser.add_argument('--heldout-dir', default=None, help='Held-out images for drift evaluation')
+    parser.add_argument('--quantization', nargs='+', default=['float16', 'int8'], choices=['float16', 'int8'])
+    args = parser.parse_args()
+
+    model = tf.keras.models.load_model(args.model)
+    calibration = list_images(args.calibration_dir) if os.path.isdir(args.calibration_dir) else []
+    if not calibration:
+        print(f"No calibration images in '{args.calibration_dir}', int8 ranges will be approximate")
+    np.random.default_rng(42).shuffle(calibration)
+    heldout = list_images(args.heldout_dir) if args.heldout_dir and os.path.isdir(args.heldout_dir) else []
+
+    base_name = os.path.splitext(os.path.basename(args.model))[0]
+    for quantization in args.quantization:
+        output_path = os.path.join(args.output_dir, f"{base_name}_{quantization}.tflite")
+        size = export_tflite(model, output_path, quantization, calibration)
+        print(f"\n✅ {quantization} model saved to: {output_path} ({size / (1024 * 1024):.2f} MB)")
+
+        if heldout:
+            report = evaluate_drift(model, output_path, heldout)
+            print(f"   Drift vs Keras on {report['images']} held-out images:")
+            for key, value in report.items():
+                if key != 'images':
+                    print(f"     {key}: {value:.4f}" if isinstance(value, float) else f"     {key}: {value}")
+
+    if not heldout:
+        print("\nPass --heldout-dir to report accuracy drift against the Keras model.")
+
+if __name__ == "__main__":
+    main()
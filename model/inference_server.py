@@ -0,0 +1,205 @@
+"""
+Shared inference process for multi-worker serving
+One process owns the model (and TensorFlow); web workers send it preprocessed
+batches over a local socket instead of each loading their own copy
+"""
+
+import threading
+import time
+
+import numpy as np
+from multiprocessing.connection import Client, Listener
+
+from model.model_utils import SkinCancerDetector
+
+# Seconds a worker reuses the server's status (readiness, model version)
+STATUS_TTL_SECONDS = 1.0
+
+
+class ServerManagedError(RuntimeError):
+    """Raised by RemoteDetector for model management, which the inference server owns"""
+
+
+def _handle_connection(conn, detector):
+    """Serve one worker connection until it closes"""
+    with conn:
+        while True:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                op = message[0]
+                if op == 'run':
+                    _, batch, version = message
+                    loaded = detector.get_version(version)
+                    if loaded is None:
+                        raise ValueError("Model is not loaded. Please ensure the model file exists.")
+                    if detector.batcher is not None and version is None and len(batch) == 1:
+                        # Requests from every worker share the server's micro-batches
+                        outputs = np.expand_dims(detector.batcher.submit(batch[0]), axis=0)
+                    else:
+                        outputs = detector._run_model(batch, loaded)
+                    conn.send(('ok', outputs, loaded.version))
+                elif op == 'status':
+                    conn.send(('ok', {
+                        'ready': detector.is_ready(),
+                        'model_version': detector.model_version,
+                        'versions': detector.versions(),
+                        'load_error': detector.load_error,
+                        'batching': detector.get_batching_metrics()
+                    }))
+                else:
+                    raise ValueError(f"Unknown operation '{op}'")
+            except Exception as e:
+                conn.send(('error', str(e)))
+
+
+def serve(detector, address, authkey=None):
+    """
+    Accept worker connections forever, one thread per connection
+
+    Args:
+        detector: SkinCancerDetector that owns the model
+        address: Unix socket path to listen on
+        authkey: Shared secret workers must present
+    """
+    with Listener(address, family='AF_UNIX', authkey=authkey) as listener:
+        print(f"Inference server listening on {address}")
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=_handle_connection, args=(conn, detector), daemon=True).start()
+
+
+def run_server(address, authkey=None, backend='keras', model_path=None, create_if_missing=True,
+               batch_size=8, batch_wait_ms=10, registry_dir=None, resident_versions=1):
+    """
+    Process entry point: build the detector, load the model and serve
+
+    The socket accepts connections immediately; workers see ready=False
+    until the model is warm.
+    """
+    detector = SkinCancerDetector(model_path, backend=backend, autoload=False,
+                                  create_if_missing=create_if_missing, resident_versions=resident_versions)
+    if batch_size and batch_size > 1:
+        detector.enable_batching(max_batch_size=batch_size, max_wait_ms=batch_wait_ms)
+
+    if registry_dir:
+        from model.model_registry import ModelRegistry
+        registry = ModelRegistry(detector, registry_dir)
+        if registry.latest() is None:
+            detector.load_in_background()
+        registry.start()
+    else:
+        detector.load_in_background()
+
+    serve(detector, address, authkey=authkey)
+
+
+class RemoteModel:
+    """LoadedModel stand-in that runs batches on the inference server"""
+
+    def __init__(self, client, version=None):
+        self._client = client
+        self._requested = version
+        self.version = version
+
+    def run(self, batch):
+        outputs, self.version = self._client.call('run', np.asarray(batch, dtype=np.float32), self._requested)
+        return outputs
+
+
+class RemoteDetector(SkinCancerDetector):
+    """
+    SkinCancerDetector whose CNN runs in a shared inference process
+
+    Decoding, visual feature analysis and preprocessing still happen in the
+    calling worker; only the (N, 224, 224, 3) batch crosses the socket. Each
+    worker thread keeps its own connection.
+    """
+
+    def __init__(self, address, authkey=None, draft_decode=True):
+        """
+        Args:
+            address: Unix socket path of the inference server
+            authkey: Shared secret configured on the server
+            draft_decode: Decode encoded JPEG inputs at reduced scale (see DRAFT_OVERSAMPLE)
+        """
+        super().__init__(draft_decode=draft_decode, autoload=False)
+        self.address = address
+        self.authkey = authkey
+        self._local = threading.local()
+        self._status = None
+        self._status_time = 0.0
+        self._seen_version = None
+
+    def call(self, *message):
+        """Send one request to the server and return its payload"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = Client(self.address, family='AF_UNIX', authkey=self.authkey)
+        try:
+            conn.send(message)
+            reply = conn.recv()
+        except (EOFError, OSError):
+            # Reconnect on the next call (e.g. the server restarted)
+            self._local.conn = None
+            raise
+        if reply[0] == 'error':
+            raise ValueError(reply[1])
+        return reply[1] if len(reply) == 2 else reply[1:]
+
+    def status(self):
+        """Server status, cached for STATUS_TTL_SECONDS"""
+        now = time.monotonic()
+        if self._status is None or now - self._status_time > STATUS_TTL_SECONDS:
+            try:
+                self._status = self.call('status')
+            except (EOFError, OSError) as e:
+                self._status = {'ready': False, 'model_version': None, 'versions': None,
+                                'load_error': f"Inference server unavailable: {e}", 'batching': None}
+            self._status_time = now
+            version = self._status['model_version']
+            if version is not None and version != self._seen_version:
+                # The server swapped models; let local caches invalidate
+                self._seen_version = version
+                for listener in self._reload_listeners:
+                    listener(version)
+        return self._status
+
+    @property
+    def model(self):
+        return None
+
+    @property
+    def model_version(self):
+        return self.status()['model_version']
+
+    def is_ready(self):
+        status = self.status()
+        self.load_error = status['load_error']
+        return status['ready']
+
+    def versions(self):
+        return self.status()['versions']
+
+    def get_version(self, version=None):
+        return RemoteModel(self, version)
+
+    def get_batching_metrics(self):
+        return self.status()['batching']
+
+    # Loading, warm-up and batching happen in the inference server process
+    # (see run_server); calling them on a worker is a configuration error
+
+    def load_model(self, model_path=None, activate=True):
+        raise ServerManagedError("Models are loaded by the inference server")
+
+    def load_in_background(self, model_path=None, activate=True):
+        raise ServerManagedError("Models are loaded by the inference server")
+
+    def warmup(self, batch_sizes=None, loaded=None):
+        raise ServerManagedError("The inference server warms up its own models")
+
+    def enable_batching(self, max_batch_size=8, max_wait_ms=10):
+        raise ServerManagedError("Batching is configured on the inference server (serve.py --batch-size)")
@@ -0,0 +1,132 @@
+"""
+Model registry for hot reloads
+Watches a directory of versioned model artifacts and swaps new versions
+into a running SkinCancerDetector without a restart
+"""
+
+import os
+import threading
+import time
+
+from model.model_utils import artifact_version
+
+# File extension of the artifacts each backend can load
+ARTIFACT_EXTENSIONS = {
+    'keras': ('.h5', '.keras'),
+    'tflite': ('.tflite',)
+}
+
+
+class ModelRegistry:
+    """
+    Directory watcher that keeps a detector on the newest model artifact
+
+    Drop a new file (e.g. model/versions/skin_cancer_model_2024-06-01.h5)
+    into the directory and, on the next poll, it is loaded and warmed in the
+    background, then atomically activated (see SkinCancerDetector.load_model).
+    The newest artifact by modification time wins. Earlier versions stay
+    resident up to the detector's resident_versions for A/B or shadow scoring.
+
+    Write artifacts under a temporary name and rename them into place; files
+    modified within the last settle_seconds are ignored until they settle.
+    """
+
+    def __init__(self, detector, directory, poll_interval=10.0, settle_seconds=2.0):
+        """
+        Args:
+            detector: SkinCancerDetector to load versions into
+            directory: Folder of versioned model artifacts
+            poll_interval: Seconds between directory scans
+            settle_seconds: Minimum age of a file before it is loaded
+        """
+        self.detector = detector
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self._failed = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def artifacts(self):
+        """
+        Loadable artifacts in the directory, oldest first
+
+        Returns:
+            List of (path, version) tuples
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        extensions = ARTIFACT_EXTENSIONS[self.detector.backend]
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.lower().endswith(extensions) and os.path.isfile(path):
+                found.append((os.path.getmtime(path), path))
+        return [(path, artifact_version(path)) for _, path in sorted(found)]
+
+    def latest(self):
+        """(path, version) of the newest settled artifact, or None"""
+        now = time.time()
+        settled = [
+            (path, version) for path, version in self.artifacts()
+            if now - os.path.getmtime(path) >= self.settle_seconds
+        ]
+        return settled[-1] if settled else None
+
+    def check_for_updates(self):
+        """
+        Load and activate the newest artifact if it is not already active
+
+        A version that fails to load is not retried until the file changes.
+
+        Returns:
+            Newly activated version id, or None if nothing changed
+        """
+        with self._lock:
+            latest = self.latest()
+            if latest is None:
+                return None
+            path, version = latest
+            if version == self.detector.model_version or version in self._failed:
+                return None
+
+            print(f"Loading model version {version} from {path}")
+            loaded_version = self.detector.load_model(path)
+            if loaded_version is None:
+                print(f"Model version {version} failed to load: {self.detector.load_error}")
+                self._failed.add(version)
+            return loaded_version
+
+    def start(self):
+        """Poll the directory on a daemon thread"""
+        if self._thread is not None:
+            return self._thread
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='model-registry', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.check_for_updates()
+            except Exception as e:
+                print(f"Model registry error: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def get_status(self):
+        """Directory, available artifacts and resident/active versions"""
+        status = self.detector.versions()
+        status.update({
+            'directory': self.directory,
+            'available': [version for _, version in self.artifacts()],
+            'failed': sorted(self._failed)
+        })
+        return status
@@ -3,78 +3,386 @@ Utility functions for loading and using the trained CNN model
 Multi-class classification: Skin Cancer, Pimples/Acne, Normal Skin
 """
 
-import tensorflow as tf
 import numpy as np
 from PIL import Image
 import os
 import sys
+import threading
+from collections import OrderedDict
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from utils.decoded_image import DecodedImage
+from model.batching import BatchScheduler
+
+# TensorFlow is imported on first use so the TFLite backend never loads it
+tf = None
+
 # Class names for 3-class classification
 CLASS_NAMES = ['normal', 'pimples', 'skin_cancer']
 NUM_CLASSES = 3
 
+# With draft_decode, the CNN input is box-reduced by an integer factor down to
+# DRAFT_OVERSAMPLE x the model input size before the final resize (resize
+# reducing_gap). predict()/prepare() always decode at full resolution, since
+# the visual features need it, so for them this is the only effect. Only
+# preprocess_image() called directly on a path or bytes also decodes JPEGs
+# at reduced scale (Image.draft). benchmark_preprocessing.py checks the
+# effect on timing and model outputs.
+DRAFT_OVERSAMPLE = 2
+
+# Batch sizes traced and run once at startup so real requests skip warm-up cost
+WARMUP_BATCH_SIZES = (1, 8)
+
+# Default model artifact for each inference backend
+DEFAULT_MODEL_PATHS = {
+    'keras': 'model/skin_cancer_model.h5',
+    'tflite': 'model/skin_cancer_model_int8.tflite'
+}
+
+def _import_tensorflow():
+    """Import TensorFlow lazily and cache the module"""
+    global tf
+    if tf is None:
+        import tensorflow
+        tf = tensorflow
+    return tf
+
+def artifact_version(model_path):
+    """Identify a model artifact by file name, mtime and size ('unloaded' if missing)"""
+    if not os.path.exists(model_path):
+        return 'unloaded'
+    stat = os.stat(model_path)
+    return f"{os.path.basename(model_path)}@{int(stat.st_mtime)}-{stat.st_size}"
+
+class LoadedModel:
+    """
+    One loaded model artifact
+    
+    Holds everything needed to run that version, so the detector can swap
+    versions by replacing a single reference; requests that already hold
+    the old LoadedModel finish on it.
+    """
+    
+    def __init__(self, model, version, path, infer=None):
+        """
+        Args:
+            model: Keras model or TFLiteModel
+            version: Version id (see artifact_version)
+            path: Artifact the model was loaded from
+            infer: Compiled tf.function for Keras models (None = model.predict)
+        """
+        self.model = model
+        self.version = version
+        self.path = path
+        self.infer = infer
+    
+    @property
+    def input_shape(self):
+        return tuple(self.model.input_shape[1:])
+    
+    def run(self, batch):
+        """Run the CNN on a preprocessed (N, 224, 224, 3) batch"""
+        if self.infer is not None:
+            return self.infer(tf.convert_to_tensor(batch, dtype=tf.float32)).numpy()
+        return self.model.predict(batch, verbose=0)
+
 class SkinCancerDetector:
     """CNN-based skin condition detection model (3-class classification)"""
     
-    def __init__(self, model_path='model/skin_cancer_model.h5'):
+    def __init__(self, model_path=None, warmup_batch_sizes=WARMUP_BATCH_SIZES, backend='keras', draft_decode=True,
+                 autoload=True, create_if_missing=True, resident_versions=1):
         """
         Initialize the detector with trained model
         
         Args:
-            model_path: Path to the saved model file
+            model_path: Path to the saved model file (defaults per backend)
+            warmup_batch_sizes: Batch sizes to run through the model at load time
+            backend: 'keras' for the .h5 model or 'tflite' for an exported .tflite model
+            draft_decode: Pre-reduce the CNN input with reducing_gap, and decode
+                JPEGs at reduced scale in preprocess_image (see DRAFT_OVERSAMPLE)
+            autoload: Load the model now; otherwise call load_model() or
+                load_in_background() later
+            create_if_missing: Build (and save) an untrained model when the Keras
+                file is missing. This downloads ImageNet weights.
+            resident_versions: Model versions kept loaded (active one included),
+                so earlier versions stay available to predict(version=...)
         """
-        self.model_path = model_path
-        self.model = None
+        if backend not in DEFAULT_MODEL_PATHS:
+            raise ValueError(f"Unknown backend '{backend}'. Use one of: {list(DEFAULT_MODEL_PATHS)}")
+        self.backend = backend
+        self.draft_decode = draft_decode
+        self.model_path = model_path or DEFAULT_MODEL_PATHS[backend]
         self.class_names = CLASS_NAMES
         self.num_classes = NUM_CLASSES
-        self.load_model()
+        self.batcher = None
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes or ())
+        self.resident_versions = max(1, resident_versions)
+        self._active = None
+        self._resident = OrderedDict()
+        self._swap_lock = threading.Lock()
+        self._reload_listeners = []
+        self.create_if_missing = create_if_missing
+        self.load_error = None
+        self._ready = threading.Event()
+        if autoload:
+            self.load_model()
+    
+    @property
+    def model(self):
+        """The active model (None until loaded)"""
+        active = self._active
+        return active.model if active is not None else None
+    
+    @property
+    def model_version(self):
+        """Version id of the active model (None until loaded)"""
+        active = self._active
+        return active.version if active is not None else None
+    
+    def load_model(self, model_path=None, activate=True):
+        """
+        Load, warm up and (optionally) activate a model artifact
+        
+        The new model is fully loaded and warmed before it replaces the active
+        one, and the swap is a single reference assignment: requests already
+        running finish on the previous version. Reload listeners are notified
+        after each activation.
+        
+        Args:
+            model_path: Artifact to load (defaults to self.model_path)
+            activate: Make it the active model; otherwise only keep it resident
+        
+        Returns:
+            Version id of the loaded model, or None if loading failed (see load_error)
+        """
+        model_path = model_path or self.model_path
+        self.load_error = None
+        if self.backend == 'tflite':
+            loaded = self._load_tflite_model(model_path)
+        else:
+            loaded = self._load_keras_model(model_path)
+        
+        if loaded is None:
+            return None
+        self.warmup(loaded=loaded)
+        
+        with self._swap_lock:
+            self._resident[loaded.version] = loaded
+            self._resident.move_to_end(loaded.version)
+            if activate:
+                self._active = loaded
+                self.model_path = model_path
+            # Evict the oldest versions other than the active one
+            for version in list(self._resident):
+                if len(self._resident) <= self.resident_versions:
+                    break
+                if self._resident[version] is not self._active:
+                    del self._resident[version]
+        
+        if activate:
+            print(f"Active model version: {loaded.version}")
+            for listener in self._reload_listeners:
+                listener(loaded.version)
+            self._ready.set()
+        return loaded.version
+    
+    def load_in_background(self, model_path=None, activate=True):
+        """
+        Start load_model() on a daemon thread and return immediately
+        
+        TensorFlow is only imported on that thread, so the caller can start
+        serving right away and poll is_ready().
+        """
+        thread = threading.Thread(
+            target=self._background_load, args=(model_path, activate), name='model-loader', daemon=True
+        )
+        thread.start()
+        return thread
     
-    def load_model(self):
-        """Load the trained CNN model"""
+    def _background_load(self, model_path, activate):
         try:
-            if os.path.exists(self.model_path):
-                self.model = tf.keras.models.load_model(self.model_path)
-                print(f"Model loaded successfully from {self.model_path}")
-            else:
-                print(f"Model file not found at {self.model_path}")
+            self.load_model(model_path, activate=activate)
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"Background model load failed: {e}")
+    
+    def is_ready(self):
+        """True once a model is loaded and warmed up"""
+        return self._ready.is_set()
+    
+    def wait_until_ready(self, timeout=None):
+        """Block until the model is ready; returns False on timeout"""
+        return self._ready.wait(timeout)
+    
+    def versions(self):
+        """Resident model versions, oldest first, and the active one"""
+        with self._swap_lock:
+            return {
+                'active': self.model_version,
+                'resident': list(self._resident)
+            }
+    
+    def get_version(self, version=None):
+        """The LoadedModel for a resident version (None = active)"""
+        if version is None:
+            return self._active
+        with self._swap_lock:
+            loaded = self._resident.get(version)
+        if loaded is None:
+            raise ValueError(f"Model version '{version}' is not loaded")
+        return loaded
+    
+    def add_reload_listener(self, listener):
+        """Call listener(model_version) every time the model is (re)loaded"""
+        self._reload_listeners.append(listener)
+    
+    def _load_keras_model(self, model_path):
+        tf = _import_tensorflow()
+        model = None
+        try:
+            if os.path.exists(model_path):
+                model = tf.keras.models.load_model(model_path)
+                print(f"Model loaded successfully from {model_path}")
+            elif self.create_if_missing:
+                print(f"Model file not found at {model_path}")
                 print("Creating a new model structure...")
-                self._create_sample_model()
+                model = self._create_sample_model(model_path)
+            else:
+                print(f"Model file not found at {model_path}")
+                self.load_error = f"Model file not found at {model_path}"
         except Exception as e:
             print(f"Error loading model: {e}")
+            if not self.create_if_missing:
+                self.load_error = str(e)
+                return None
             print("Creating a new model structure...")
-            self._create_sample_model()
+            model = self._create_sample_model(model_path)
+        
+        if model is None:
+            return None
+        return LoadedModel(model, artifact_version(model_path), model_path, infer=self._build_inference_fn(model))
     
-    def _create_sample_model(self):
+    def _load_tflite_model(self, model_path):
+        from model.tflite_backend import TFLiteModel
+        try:
+            model = TFLiteModel(model_path)
+            print(f"TFLite model loaded successfully from {model_path}")
+        except Exception as e:
+            print(f"Error loading TFLite model: {e}")
+            print("Export one with: python model/export_model.py")
+            self.load_error = str(e)
+            return None
+        return LoadedModel(model, artifact_version(model_path), model_path)
+    
+    def _build_inference_fn(self, model):
+        """
+        Wrap the model in a tf.function with a fixed input signature
+        
+        Calling the compiled function skips the data adapter and callback
+        setup that Model.predict repeats on every call.
+        """
+        tf = _import_tensorflow()
+        input_shape = tuple(model.input_shape[1:])
+        
+        @tf.function(input_signature=[tf.TensorSpec(shape=(None,) + input_shape, dtype=tf.float32)])
+        def infer(batch):
+            return model(batch, training=False)
+        
+        return infer
+    
+    def warmup(self, batch_sizes=None, loaded=None):
+        """Trace and run the inference path on dummy batches (active model by default)"""
+        loaded = loaded or self._active
+        if loaded is None:
+            return
+        for batch_size in (batch_sizes or self.warmup_batch_sizes):
+            loaded.run(np.zeros((batch_size,) + loaded.input_shape, dtype=np.float32))
+    
+    def _create_sample_model(self, model_path):
         """Create a sample model structure if trained model is not available"""
         from model.train_model import create_model
-        self.model = create_model()
+        model = create_model()
         # Save the untrained model structure
-        os.makedirs('model', exist_ok=True)
-        self.model.save(self.model_path)
+        os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+        model.save(model_path)
         print("Sample model structure created. Please train the model with actual data.")
+        return model
+    
+    def enable_batching(self, max_batch_size=8, max_wait_ms=10):
+        """
+        Route predictions through a micro-batching scheduler
+        
+        Concurrent predict() calls are grouped into a single model call of up to
+        max_batch_size images, waiting at most max_wait_ms for a batch to fill.
+        Batches always run on the active model.
+        """
+        if self.batcher is not None:
+            self.batcher.stop()
+        self.batcher = BatchScheduler(self._run_model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        if max_batch_size not in self.warmup_batch_sizes:
+            # Also warmed by load_model() if the model is not loaded yet
+            self.warmup_batch_sizes += (max_batch_size,)
+            self.warmup((max_batch_size,))
+        return self.batcher
+    
+    def get_batching_metrics(self):
+        """Batch-size and queue-wait metrics, or None when batching is off"""
+        if self.batcher is None:
+            return None
+        return self.batcher.get_metrics()
+    
+    def _run_model(self, batch, loaded=None):
+        """Run the CNN on a preprocessed (N, 224, 224, 3) batch (active model by default)"""
+        loaded = loaded or self._active
+        if loaded is None:
+            raise ValueError("Model is not loaded. Please ensure the model file exists.")
+        return loaded.run(batch)
+    
+    def _draft_size(self, target_size=(224, 224)):
+        """Minimum decode size for encoded inputs, or None for a full decode"""
+        if not self.draft_decode:
+            return None
+        return (target_size[1] * DRAFT_OVERSAMPLE, target_size[0] * DRAFT_OVERSAMPLE)
+    
+    def decode(self, source, target_size=(224, 224)):
+        """
+        Decode a path or encoded bytes for inference
+        
+        JPEGs are downscaled during decoding when draft_decode is on, which
+        skips most of the IDCT work for large camera images.
+        """
+        if isinstance(source, str):
+            return DecodedImage.from_path(source, draft_size=self._draft_size(target_size))
+        return DecodedImage.from_bytes(bytes(source), draft_size=self._draft_size(target_size))
     
     def preprocess_image(self, image_path_or_array, target_size=(224, 224)):
         """
         Preprocess image for CNN input
         
         Args:
-            image_path_or_array: Path to image file or numpy array
+            image_path_or_array: Path to image file, encoded bytes, numpy array or DecodedImage
             target_size: Target size (height, width)
         
         Returns:
             Preprocessed image array
         """
         # Load image
-        if isinstance(image_path_or_array, str):
-            img = Image.open(image_path_or_array).convert('RGB')
+        if isinstance(image_path_or_array, (str, bytes, bytearray)):
+            image_path_or_array = self.decode(image_path_or_array, target_size)
+        
+        if isinstance(image_path_or_array, DecodedImage):
+            img = image_path_or_array.to_pil()
         else:
             img = Image.fromarray(image_path_or_array).convert('RGB')
         
-        # Resize to target size
-        img = img.resize(target_size)
+        # Resize to target size; with draft_decode, large inputs are first
+        # box-reduced by an integer factor down to DRAFT_OVERSAMPLE x target
+        if self.draft_decode:
+            img = img.resize(target_size, reducing_gap=DRAFT_OVERSAMPLE)
+        else:
+            img = img.resize(target_size)
         
         # Convert to array and normalize
         img_array = np.array(img, dtype=np.float32)
@@ -94,12 +402,14 @@ class SkinCancerDetector:
             Dictionary with feature analysis scores
         """
         # Load image
-        if isinstance(image_path_or_array, str):
-            img = Image.open(image_path_or_array).convert('RGB')
+        if isinstance(image_path_or_array, DecodedImage):
+            img_array = image_path_or_array.rgb.astype(np.float32)
         else:
-            img = Image.fromarray(image_path_or_array).convert('RGB')
-        
-        img_array = np.array(img, dtype=np.float32)
+            if isinstance(image_path_or_array, str):
+                img = Image.open(image_path_or_array).convert('RGB')
+            else:
+                img = Image.fromarray(image_path_or_array).convert('RGB')
+            img_array = np.array(img, dtype=np.float32)
         
         # Analyze color variation (cancer often has multiple colors)
         color_std = np.std(img_array, axis=(0, 1)).mean()
@@ -138,17 +448,31 @@ class SkinCancerDetector:
             'suggests_cancer': cancer_indicators >= 2
         }
     
-    def predict(self, image_path_or_array):
+    def prepare(self, image_path_or_array):
         """
-        Predict skin condition using CNN + visual feature analysis
-        Combines CNN predictions with pattern recognition for improved accuracy
+        Run the CPU-side stages of predict: visual feature analysis and preprocessing
+        
+        Lets a caller overlap this work with validation and pass the result
+        to predict(prepared=...).
         
         Args:
-            image_path_or_array: Path to image file or numpy array
+            image_path_or_array: Path to image file, encoded bytes, numpy array or DecodedImage
         
         Returns:
-            Dictionary with prediction results
+            Dictionary with visual_features and processed_image
         """
+        if isinstance(image_path_or_array, (str, bytes, bytearray)):
+            # Visual features depend on full-resolution color and texture
+            # variance, so decode once at full resolution and build the CNN
+            # input from the same buffer
+            try:
+                if isinstance(image_path_or_array, str):
+                    image_path_or_array = DecodedImage.from_path(image_path_or_array)
+                else:
+                    image_path_or_array = DecodedImage.from_bytes(bytes(image_path_or_array))
+            except Exception as e:
+                raise ValueError(f"Image preprocessing failed: {str(e)}")
+        
         # Analyze visual features first
         try:
             visual_features = self.analyze_visual_features(image_path_or_array)
@@ -162,11 +486,39 @@ class SkinCancerDetector:
         except Exception as e:
             raise ValueError(f"Image preprocessing failed: {str(e)}")
         
+        return {'visual_features': visual_features, 'processed_image': processed_image}
+    
+    def predict(self, image_path_or_array, prepared=None, version=None):
+        """
+        Predict skin condition using CNN + visual feature analysis
+        Combines CNN predictions with pattern recognition for improved accuracy
+        
+        Args:
+            image_path_or_array: Path to image file, encoded bytes, numpy array or
+                DecodedImage. Paths and bytes are decoded once at full
+                resolution and shared by both stages.
+            prepared: Result of prepare() for this image, to skip those stages
+            version: Resident model version to use (None = active model)
+        
+        Returns:
+            Dictionary with prediction results, including the model_version used
+        """
+        # Pin one model for the whole call so a concurrent swap can't mix versions
+        loaded = self.get_version(version)
+        if loaded is None:
+            raise ValueError("Model is not loaded. Please ensure the model file exists.")
+        
+        if prepared is None:
+            prepared = self.prepare(image_path_or_array)
+        visual_features = prepared['visual_features']
+        processed_image = prepared['processed_image']
+        
         # Make CNN prediction
         try:
-            if self.model is None:
-                raise ValueError("Model is not loaded. Please ensure the model file exists.")
-            prediction = self.model.predict(processed_image, verbose=0)
+            if self.batcher is not None and version is None:
+                prediction = np.expand_dims(self.batcher.submit(processed_image[0]), axis=0)
+            else:
+                prediction = self._run_model(processed_image, loaded)
         except Exception as e:
             raise ValueError(f"CNN prediction failed: {str(e)}")
         
@@ -258,6 +610,7 @@ class SkinCancerDetector:
             },
             'is_cancerous': predicted_class == 'skin_cancer',
             'is_pimples': predicted_class == 'pimples',
-            'is_normal': predicted_class == 'normal'
+            'is_normal': predicted_class == 'normal',
+            'model_version': loaded.version
         }
 
@@ -0,0 +1,80 @@
+"""
+TFLite inference backend for SkinCancerDetector
+Runs exported (float16 / int8) models without importing full TensorFlow
+when the lightweight tflite_runtime package is installed
+"""
+
+import threading
+
+import numpy as np
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:  # Fall back to the interpreter bundled with TensorFlow
+    Interpreter = None
+
+
+def _make_interpreter(model_path, num_threads=None):
+    if Interpreter is not None:
+        return Interpreter(model_path=model_path, num_threads=num_threads)
+    print("tflite_runtime is not installed; loading TensorFlow for the TFLite interpreter "
+          "(pip install tflite-runtime to avoid it)")
+    import tensorflow as tf
+    return tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+
+
+class TFLiteModel:
+    """Minimal Keras-like wrapper around a TFLite interpreter"""
+
+    def __init__(self, model_path, num_threads=None):
+        """
+        Args:
+            model_path: Path to the .tflite file
+            num_threads: Interpreter threads (None = runtime default)
+        """
+        self.model_path = model_path
+        self.interpreter = _make_interpreter(model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # The interpreter holds mutable tensor buffers and is not thread-safe
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        """Input shape with a free batch dimension, like keras Model.input_shape"""
+        return (None,) + tuple(int(d) for d in self._input['shape'][1:])
+
+    def _resize(self, batch_size):
+        if batch_size != self._batch_size:
+            self.interpreter.resize_tensor_input(
+                self._input['index'], [batch_size] + list(self._input['shape'][1:])
+            )
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, batch, verbose=0):
+        """
+        Run a float32 (N, H, W, C) batch and return float32 (N, K) outputs
+
+        Quantized input/output tensors are (de)quantized transparently.
+        """
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            self._resize(batch.shape[0])
+
+            input_dtype = self._input['dtype']
+            if input_dtype != np.float32:
+                scale, zero_point = self._input['quantization']
+                batch = np.round(batch / scale + zero_point).astype(input_dtype)
+            self.interpreter.set_tensor(self._input['index'], batch)
+            self.interpreter.invoke()
+            output = self.interpreter.get_tensor(self._output['index']).copy()
+
+        if output.dtype != np.float32:
+            scale, zero_point = self._output['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
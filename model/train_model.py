@@ -8,9 +8,16 @@ import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
 from tensorflow.keras.applications import MobileNetV2, EfficientNetB0
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 import numpy as np
+import glob
+import hashlib
 import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 # Set random seeds for reproducibility
 tf.random.set_seed(42)
@@ -20,6 +27,222 @@ np.random.seed(42)
 CLASS_NAMES = ['normal', 'pimples', 'skin_cancer']
 NUM_CLASSES = 3
 
+IMAGE_SIZE = (224, 224)
+
+# Extensions flow_from_directory accepted, so the same files are used;
+# PPM and TIFF are decoded through PIL (see _decode)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.ppm', '.tif', '.tiff')
+
+# Decoded, resized training images are cached here between epochs and runs
+DEFAULT_CACHE_DIR = '.tfdata_cache'
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+def list_image_files(data_dir, subset=None, validation_split=0.0):
+    """
+    List image files and class indices with flow_from_directory's split
+    
+    Within each class folder files are sorted by path; the first
+    validation_split fraction is the 'validation' subset and the rest is
+    'training', so existing train/validation splits are preserved.
+    
+    Args:
+        data_dir: Directory with one subfolder per class in CLASS_NAMES
+        subset: 'training', 'validation' or None for all files
+        validation_split: Fraction of each class used for validation
+    
+    Returns:
+        Tuple (paths, labels)
+    """
+    paths = []
+    labels = []
+    for class_index, class_name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(data_dir, class_name)
+        files = []
+        for root, _, names in sorted(os.walk(class_dir), key=lambda entry: entry[0]):
+            for name in sorted(names):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    files.append(os.path.join(root, name))
+        split_at = int(validation_split * len(files))
+        if subset == 'validation':
+            files = files[:split_at]
+        elif subset == 'training':
+            files = files[split_at:]
+        paths.extend(files)
+        labels.extend([class_index] * len(files))
+    return paths, labels
+
+def _dataset_digest(paths, image_size):
+    """Digest that changes whenever the file list, files or image size change"""
+    digest = hashlib.sha1(repr(image_size).encode())
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_mtime_ns}|{stat.st_size}\n".encode())
+    return digest.hexdigest()[:16]
+
+# Open owner-lock files, held for the life of the process (see _cache_path)
+_cache_owners = {}
+
+def _cache_path(cache_dir, subset, paths, image_size):
+    """
+    Decoded-image cache file for a subset, or None to cache in memory
+    
+    The process takes an exclusive flock on '<cache>.owner' for its whole
+    lifetime. Holding it means no other run is reading or writing the cache,
+    so tf.data lockfiles found at that point are crash leftovers and are
+    removed. If another live run holds it, this run caches in memory instead
+    of touching that run's files.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{subset or 'all'}_{_dataset_digest(paths, image_size)}")
+    if cache_path in _cache_owners:
+        return cache_path
+    if fcntl is None:
+        # No flock (Windows): leave any lockfile for the user to remove
+        return cache_path
+    
+    owner = open(cache_path + '.owner', 'a')
+    try:
+        fcntl.flock(owner.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        owner.close()
+        print(f"Cache {cache_path} is in use by another run; caching {subset or 'all'} images in memory")
+        return None
+    _cache_owners[cache_path] = owner
+    
+    # No other run owns the cache, so these were left by a crashed run
+    for lockfile in glob.glob(cache_path + '*.lockfile'):
+        os.remove(lockfile)
+    return cache_path
+
+def _pil_decode(path):
+    """Decode formats tf.io.decode_image does not support (PPM, TIFF) to RGB uint8"""
+    from PIL import Image
+    with Image.open(path.decode('utf-8')) as image:
+        return np.asarray(image.convert('RGB'), dtype=np.uint8)
+
+def _decode(path):
+    def native():
+        return tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    
+    def pil():
+        image = tf.numpy_function(_pil_decode, [path], tf.uint8)
+        image.set_shape([None, None, 3])
+        return image
+    
+    is_native = tf.strings.regex_full_match(tf.strings.lower(path), r'.*\.(png|jpe?g|bmp|gif)')
+    return tf.cond(is_native, native, pil)
+
+def _decode_and_resize(path, label, image_size=IMAGE_SIZE):
+    image = _decode(path)
+    image = tf.image.resize(image, image_size, antialias=True)
+    # uint8 keeps the on-disk cache at a quarter of the float32 size
+    image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    return image, tf.one_hot(label, NUM_CLASSES)
+
+def build_augmentation():
+    """
+    Vectorized augmentation applied to whole batches
+    
+    Mirrors the previous ImageDataGenerator settings (rotation 30 degrees,
+    shifts and zoom 0.2, horizontal flip, brightness 0.8-1.2, nearest fill).
+    Shear has no built-in Keras layer and is not applied.
+    """
+    def random_brightness(images):
+        factors = tf.random.uniform([tf.shape(images)[0], 1, 1, 1], 0.8, 1.2)
+        return tf.clip_by_value(images * factors, 0.0, 255.0)
+    
+    return keras.Sequential([
+        layers.RandomFlip('horizontal'),
+        layers.RandomRotation(30 / 360, fill_mode='nearest'),
+        layers.RandomTranslation(0.2, 0.2, fill_mode='nearest'),
+        layers.RandomZoom(0.2, fill_mode='nearest'),
+        layers.Lambda(random_brightness)
+    ], name='augmentation')
+
+def make_dataset(data_dir, subset=None, batch_size=32, validation_split=0.0, image_size=IMAGE_SIZE,
+                 cache_dir=DEFAULT_CACHE_DIR, augment=False, shuffle=False):
+    """
+    tf.data pipeline: parallel decode -> disk cache -> shuffle -> batch -> augment -> prefetch
+    
+    Images are decoded and resized once; later epochs (and later runs over
+    the same files) read the cache. Outputs are float32 in [0, 1] with
+    one-hot labels, as the ImageDataGenerator pipeline produced.
+    
+    Args:
+        data_dir: Directory with one subfolder per class in CLASS_NAMES
+        subset: 'training', 'validation' or None
+        batch_size: Batch size
+        validation_split: Fraction of each class used for validation
+        image_size: (height, width) fed to the model
+        cache_dir: Directory for the decoded-image cache (None = cache in memory)
+        augment: Apply build_augmentation() to each batch
+        shuffle: Reshuffle every epoch
+    
+    Returns:
+        Tuple (dataset, number of images)
+    """
+    paths, labels = list_image_files(data_dir, subset, validation_split)
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    dataset = dataset.map(
+        lambda path, label: _decode_and_resize(path, label, image_size), num_parallel_calls=AUTOTUNE
+    )
+    cache_path = _cache_path(cache_dir, subset, paths, image_size) if cache_dir else None
+    dataset = dataset.cache(cache_path or '')
+    if shuffle:
+        dataset = dataset.shuffle(min(len(paths), 2048) or 1, seed=42, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(lambda images, labels: (tf.cast(images, tf.float32), labels), num_parallel_calls=AUTOTUNE)
+    if augment:
+        augmentation = build_augmentation()
+        dataset = dataset.map(
+            lambda images, labels: (augmentation(images, training=True), labels), num_parallel_calls=AUTOTUNE
+        )
+    dataset = dataset.map(lambda images, labels: (images / 255.0, labels), num_parallel_calls=AUTOTUNE)
+    return dataset.prefetch(AUTOTUNE), len(paths)
+
+class ThroughputCallback(keras.callbacks.Callback):
+    """Report training images/sec for each epoch (validation time excluded)"""
+    
+    def __init__(self, num_images):
+        super().__init__()
+        self.num_images = num_images
+        self.history = []
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+        self._train_seconds = None
+    
+    def on_test_begin(self, logs=None):
+        if self._train_seconds is None:
+            self._train_seconds = time.perf_counter() - self._started
+    
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = self._train_seconds or (time.perf_counter() - self._started)
+        images_per_sec = self.num_images / seconds if seconds else 0.0
+        self.history.append(images_per_sec)
+        if logs is not None:
+            logs['images_per_sec'] = images_per_sec
+        print(f"\nEpoch {epoch + 1}: {images_per_sec:.1f} images/sec ({seconds:.1f}s)")
+
+def _head_layers():
+    """Classification head on top of the pooled backbone features"""
+    return [
+        layers.Dropout(0.3),
+        layers.Dense(256, activation='relu'),
+        layers.Dropout(0.3),
+        layers.Dense(128, activation='relu'),
+        layers.Dropout(0.2),
+        layers.Dense(NUM_CLASSES, activation='softmax')  # 3-class classification
+    ]
+
+def _compile(model, learning_rate):
+    model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='categorical_crossentropy',
+        metrics=['accuracy', 'top_k_categorical_accuracy']
+    )
+
 def create_model(input_shape=(224, 224, 3), base_model_type='mobilenet'):
     """
     Create CNN model using transfer learning for 3-class classification
@@ -51,25 +274,101 @@ def create_model(input_shape=(224, 224, 3), base_model_type='mobilenet'):
     # Build the model with 3-class output
     model = keras.Sequential([
         base_model,
-        layers.GlobalAveragePooling2D(),
-        layers.Dropout(0.3),
-        layers.Dense(256, activation='relu'),
-        layers.Dropout(0.3),
-        layers.Dense(128, activation='relu'),
-        layers.Dropout(0.2),
-        layers.Dense(NUM_CLASSES, activation='softmax')  # 3-class classification
-    ])
+        layers.GlobalAveragePooling2D()
+    ] + _head_layers())
     
     # Compile the model
-    model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=0.0001),
-        loss='categorical_crossentropy',
-        metrics=['accuracy', 'top_k_categorical_accuracy']
-    )
+    _compile(model, learning_rate=0.0001)
     
     return model
 
-def train_model(data_dir, epochs=30, batch_size=32, validation_split=0.2, base_model_type='mobilenet'):
+def create_head(feature_dim):
+    """
+    Stand-alone classification head trained on cached backbone features
+    
+    Has the same layers as the top of create_model, so its weights can be
+    copied into the full model with transfer_head_weights.
+    
+    Args:
+        feature_dim: Size of the pooled backbone features (1280 for MobileNetV2)
+    
+    Returns:
+        Compiled Keras model
+    """
+    head = keras.Sequential([layers.Input(shape=(feature_dim,))] + _head_layers())
+    _compile(head, learning_rate=0.0001)
+    return head
+
+def transfer_head_weights(head, model):
+    """Copy the Dense weights of a trained head into the full model"""
+    head_dense = [layer for layer in head.layers if isinstance(layer, layers.Dense)]
+    model_dense = [layer for layer in model.layers if isinstance(layer, layers.Dense)]
+    for source, target in zip(head_dense, model_dense):
+        target.set_weights(source.get_weights())
+
+def extract_features(model, data_dir, subset, batch_size=32, validation_split=0.0, variants=0,
+                     cache_dir=DEFAULT_CACHE_DIR, base_model_type='mobilenet'):
+    """
+    Pooled backbone features for a subset, stored in a memory-mapped .npy
+    
+    The frozen backbone runs once per image and variant. Variant 0 is the
+    plain image; variants 1..n are independent random augmentations. The
+    store is reused while the files, image size and backbone are unchanged.
+    
+    Args:
+        model: Model from create_model (backbone is model.layers[0])
+        data_dir: Directory with one subfolder per class in CLASS_NAMES
+        subset: 'training', 'validation' or None
+        batch_size: Batch size for the backbone pass
+        validation_split: Fraction of each class used for validation
+        variants: Number of augmented copies in addition to the plain images
+        cache_dir: Directory for the image and feature caches
+        base_model_type: Backbone name, part of the store key
+    
+    Returns:
+        Tuple (features, labels): read-only memmap of shape
+        (variants + 1, num_images, feature_dim) and one-hot labels
+    """
+    paths, labels = list_image_files(data_dir, subset, validation_split)
+    labels = np.eye(NUM_CLASSES, dtype=np.float32)[labels]
+    
+    extractor = keras.Sequential([model.layers[0], layers.GlobalAveragePooling2D()])
+    feature_dim = extractor.output_shape[-1]
+    
+    feature_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'features')
+    os.makedirs(feature_dir, exist_ok=True)
+    digest = _dataset_digest(paths, IMAGE_SIZE)
+    store_path = os.path.join(feature_dir, f"{subset or 'all'}_{digest}_{base_model_type}_v{variants}.npy")
+    if os.path.exists(store_path):
+        print(f"Using cached features {store_path}")
+        return np.load(store_path, mmap_mode='r'), labels
+    
+    # Written under a temporary name so an interrupted run is not reused
+    tmp_path = store_path + '.tmp.npy'
+    features = np.lib.format.open_memmap(
+        tmp_path, mode='w+', dtype=np.float32, shape=(variants + 1, len(paths), feature_dim)
+    )
+    for variant in range(variants + 1):
+        dataset, _ = make_dataset(
+            data_dir, subset=subset, batch_size=batch_size, validation_split=validation_split,
+            cache_dir=cache_dir, augment=variant > 0, shuffle=False
+        )
+        started = time.perf_counter()
+        offset = 0
+        for images, _ in dataset:
+            batch_features = extractor(images, training=False).numpy()
+            features[variant, offset:offset + len(batch_features)] = batch_features
+            offset += len(batch_features)
+        seconds = time.perf_counter() - started
+        print(f"Extracted {subset} features, variant {variant}: "
+              f"{offset / seconds if seconds else 0.0:.1f} images/sec")
+    features.flush()
+    del features
+    os.replace(tmp_path, store_path)
+    return np.load(store_path, mmap_mode='r'), labels
+
+def train_model(data_dir, epochs=30, batch_size=32, validation_split=0.2, base_model_type='mobilenet',
+                cache_dir=DEFAULT_CACHE_DIR, feature_cache=False, feature_variants=0):
     """
     Train the CNN model on skin condition images (3-class classification)
     
@@ -79,52 +378,28 @@ def train_model(data_dir, epochs=30, batch_size=32, validation_split=0.2, base_m
         batch_size: Batch size for training
         validation_split: Fraction of data to use for validation
         base_model_type: 'mobilenet' or 'efficientnet'
+        cache_dir: Directory for the decoded-image cache (None = keep it in memory)
+        feature_cache: Train the head on cached frozen-backbone features
+            instead of running the backbone every epoch
+        feature_variants: Augmented copies of each training image to
+            extract when feature_cache is set
     """
     # Create model
     model = create_model(base_model_type=base_model_type)
     
-    # Data augmentation for training (as per requirements)
-    train_datagen = ImageDataGenerator(
-        rescale=1./255,
-        validation_split=validation_split,
-        rotation_range=30,  # Rotation augmentation
-        width_shift_range=0.2,
-        height_shift_range=0.2,
-        horizontal_flip=True,  # Horizontal flip
-        zoom_range=0.2,  # Zoom augmentation
-        brightness_range=[0.8, 1.2],
-        shear_range=0.2,
-        fill_mode='nearest'
-    )
-    
-    # Validation data generator (no augmentation)
-    val_datagen = ImageDataGenerator(
-        rescale=1./255,
-        validation_split=validation_split
-    )
-    
-    # Training generator (categorical for multi-class)
-    train_generator = train_datagen.flow_from_directory(
-        data_dir,
-        target_size=(224, 224),
-        batch_size=batch_size,
-        class_mode='categorical',  # Multi-class classification
-        subset='training',
-        shuffle=True
+    # tf.data input pipelines (same class folders and validation split as before)
+    train_dataset, num_train = make_dataset(
+        data_dir, subset='training', batch_size=batch_size, validation_split=validation_split,
+        cache_dir=cache_dir, augment=True, shuffle=True
     )
-    
-    # Validation generator
-    val_generator = val_datagen.flow_from_directory(
-        data_dir,
-        target_size=(224, 224),
-        batch_size=batch_size,
-        class_mode='categorical',  # Multi-class classification
-        subset='validation',
-        shuffle=False
+    val_dataset, num_val = make_dataset(
+        data_dir, subset='validation', batch_size=batch_size, validation_split=validation_split,
+        cache_dir=cache_dir
     )
     
     # Print class indices for reference
-    print("\nClass indices:", train_generator.class_indices)
+    print(f"\nClass indices: {dict((name, i) for i, name in enumerate(CLASS_NAMES))}")
+    print(f"Found {num_train} training and {num_val} validation images")
     
     # Callbacks
     callbacks = [
@@ -144,18 +419,25 @@ def train_model(data_dir, epochs=30, batch_size=32, validation_split=0.2, base_m
             factor=0.5,
             patience=3,
             min_lr=1e-7
-        )
+        ),
+        ThroughputCallback(num_train)
     ]
     
     # Train the model
-    print("Starting model training...")
-    history = model.fit(
-        train_generator,
-        epochs=epochs,
-        validation_data=val_generator,
-        callbacks=callbacks,
-        verbose=1
-    )
+    if feature_cache:
+        history = train_head_on_features(
+            model, data_dir, epochs=epochs, batch_size=batch_size, validation_split=validation_split,
+            variants=feature_variants, cache_dir=cache_dir, base_model_type=base_model_type
+        )
+    else:
+        print("Starting model training...")
+        history = model.fit(
+            train_dataset,
+            epochs=epochs,
+            validation_data=val_dataset,
+            callbacks=callbacks,
+            verbose=1
+        )
     
     # Fine-tuning: Unfreeze some layers
     print("\nStarting fine-tuning...")
@@ -167,18 +449,15 @@ def train_model(data_dir, epochs=30, batch_size=32, validation_split=0.2, base_m
         layer.trainable = False
     
     # Recompile with lower learning rate
-    model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=0.00001),
-        loss='categorical_crossentropy',
-        metrics=['accuracy', 'top_k_categorical_accuracy']
-    )
+    _compile(model, learning_rate=0.00001)
     
-    # Continue training
+    # Continue training (the head was trained outside model.fit when using
+    # cached features, so its epochs do not count here)
     history_fine = model.fit(
-        train_generator,
+        train_dataset,
         epochs=10,
-        initial_epoch=history.epoch[-1],
-        validation_data=val_generator,
+        initial_epoch=0 if feature_cache else history.epoch[-1],
+        validation_data=val_dataset,
         callbacks=callbacks,
         verbose=1
     )
@@ -189,6 +468,62 @@ def train_model(data_dir, epochs=30, batch_size=32, validation_split=0.2, base_m
     
     return model, history
 
+def train_head_on_features(model, data_dir, epochs=30, batch_size=32, validation_split=0.2, variants=0,
+                           cache_dir=DEFAULT_CACHE_DIR, base_model_type='mobilenet'):
+    """
+    First training phase on cached features; the trained head is copied into model
+    
+    Args:
+        model: Model from create_model whose head is trained
+        variants: Augmented copies of each training image (validation uses plain images)
+        Other arguments as for train_model
+    
+    Returns:
+        Keras History of the head training
+    """
+    train_features, train_labels = extract_features(
+        model, data_dir, 'training', batch_size=batch_size, validation_split=validation_split,
+        variants=variants, cache_dir=cache_dir, base_model_type=base_model_type
+    )
+    val_features, val_labels = extract_features(
+        model, data_dir, 'validation', batch_size=batch_size, validation_split=validation_split,
+        cache_dir=cache_dir, base_model_type=base_model_type
+    )
+    
+    # Every variant is a separate training example with the image's label
+    num_variants, num_images, feature_dim = train_features.shape
+    train_features = train_features.reshape(num_variants * num_images, feature_dim)
+    train_labels = np.tile(train_labels, (num_variants, 1))
+    
+    head = create_head(feature_dim)
+    print("Starting head training on cached features...")
+    history = head.fit(
+        train_features,
+        train_labels,
+        epochs=epochs,
+        batch_size=batch_size,
+        shuffle=True,
+        validation_data=(val_features[0], val_labels),
+        callbacks=[
+            keras.callbacks.EarlyStopping(
+                monitor='val_loss',
+                patience=5,
+                restore_best_weights=True
+            ),
+            keras.callbacks.ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=0.5,
+                patience=3,
+                min_lr=1e-7
+            ),
+            ThroughputCallback(len(train_features))
+        ],
+        verbose=1
+    )
+    
+    transfer_head_weights(head, model)
+    return history
+
 if __name__ == "__main__":
     # Example usage
     # Make sure your data directory has this structure:
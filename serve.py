@@ -0,0 +1,166 @@
+"""
+Production entry point for Skin Saviour
+Runs one shared inference process that owns the model and a preforked pool
+of gunicorn web workers that talk to it over a Unix socket
+
+    python serve.py --workers 4 --bind 0.0.0.0:5000 --memory-report 60
+"""
+
+import argparse
+import multiprocessing
+import os
+import secrets
+import tempfile
+import threading
+import time
+
+from model.inference_server import run_server
+
+# Environment variables read by app.py in each web worker
+SOCKET_ENV = 'SKIN_SAVIOUR_INFERENCE_SOCKET'
+AUTHKEY_ENV = 'SKIN_SAVIOUR_INFERENCE_AUTHKEY'
+
+
+def process_memory(pid):
+    """
+    RSS and PSS of a process in MB (Linux only, None elsewhere)
+
+    PSS splits shared pages between the processes mapping them, so summing
+    PSS over all processes gives the real footprint of the deployment.
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+    to_mb = lambda key: int(fields[key].split()[0]) / 1024.0
+    return {'rss_mb': to_mb('Rss'), 'pss_mb': to_mb('Pss')}
+
+
+def memory_report(processes):
+    """
+    Print per-process memory and a sizing estimate
+
+    Args:
+        processes: List of (role, pid) tuples
+    """
+    rows = [(role, pid, process_memory(pid)) for role, pid in processes]
+    rows = [row for row in rows if row[2] is not None]
+    if not rows:
+        return
+    print("\nMemory per process (MB):")
+    for role, pid, memory in rows:
+        print(f"  {role:10s} pid {pid:<8d} RSS {memory['rss_mb']:8.1f}  PSS {memory['pss_mb']:8.1f}")
+
+    worker_pss = [memory['pss_mb'] for role, _, memory in rows if role == 'worker']
+    fixed_pss = sum(memory['pss_mb'] for role, _, memory in rows if role != 'worker')
+    total = fixed_pss + sum(worker_pss)
+    print(f"  total PSS {total:.1f}")
+    if worker_pss:
+        per_worker = sum(worker_pss) / len(worker_pss)
+        print(f"  sizing: {fixed_pss:.1f} MB (master + inference) + {per_worker:.1f} MB per worker")
+
+
+def start_inference_process(args, socket_path, authkey):
+    """Start the inference server in its own (spawned) process and wait for its socket"""
+    # spawn: the server imports TensorFlow itself instead of inheriting state
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(
+        target=run_server,
+        name='inference-server',
+        kwargs={
+            'address': socket_path,
+            'authkey': authkey,
+            'backend': args.backend,
+            'model_path': args.model_path,
+            'batch_size': args.batch_size,
+            'batch_wait_ms': args.batch_wait_ms,
+            'registry_dir': args.registry_dir,
+            'resident_versions': args.resident_versions
+        },
+        daemon=True
+    )
+    process.start()
+
+    deadline = time.monotonic() + 30
+    while not os.path.exists(socket_path):
+        if not process.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("Inference server failed to start")
+        time.sleep(0.05)
+    return process
+
+
+def run_web_workers(args, inference_process):
+    """Run the gunicorn arbiter (blocks until shutdown)"""
+    from gunicorn.app.base import BaseApplication
+
+    def when_ready(arbiter):
+        if not args.memory_report:
+            return
+
+        def report_loop():
+            while True:
+                time.sleep(args.memory_report)
+                processes = [('master', arbiter.pid), ('inference', inference_process.pid)]
+                processes += [('worker', pid) for pid in list(arbiter.WORKERS)]
+                memory_report(processes)
+
+        threading.Thread(target=report_loop, name='memory-report', daemon=True).start()
+
+    class WebApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': args.bind,
+                'workers': args.workers,
+                'threads': args.threads,
+                'worker_class': 'gthread',
+                'timeout': 60,
+                # Each worker imports app.py itself; with no model in the
+                # workers there is nothing worth sharing copy-on-write
+                'preload_app': False,
+                'when_ready': when_ready
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    WebApplication().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run Skin Saviour with a shared inference process and web workers')
+    parser.add_argument('--bind', default='0.0.0.0:5000')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Web worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='Request threads per web worker')
+    parser.add_argument('--socket', default=None, help='Unix socket for the inference process')
+    parser.add_argument('--backend', default='keras', choices=['keras', 'tflite'])
+    parser.add_argument('--model-path', default=None, help='Model artifact (defaults per backend)')
+    parser.add_argument('--registry-dir', default=None, help='Directory of versioned artifacts to hot-reload')
+    parser.add_argument('--resident-versions', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=8, help='Max micro-batch size across all workers')
+    parser.add_argument('--batch-wait-ms', type=float, default=10)
+    parser.add_argument('--memory-report', type=float, default=0,
+                        help='Print per-process memory every N seconds (0 = off)')
+    args = parser.parse_args()
+
+    socket_path = args.socket or os.path.join(tempfile.gettempdir(), f'skin-saviour-{os.getpid()}.sock')
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    authkey = secrets.token_bytes(16)
+
+    inference_process = start_inference_process(args, socket_path, authkey)
+    os.environ[SOCKET_ENV] = socket_path
+    os.environ[AUTHKEY_ENV] = authkey.hex()
+    try:
+        run_web_workers(args, inference_process)
+    finally:
+        inference_process.terminate()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    main()
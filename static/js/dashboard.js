@@ -440,11 +440,11 @@ async function viewScanDetails(predictionId) {
  */
 async function loadRecentActivity() {
     try {
-        const response = await fetch('/api/prediction-history');
+        const response = await fetch('/api/prediction-history?limit=5&fields=prediction_id,timestamp,condition,confidence');
         const data = await response.json();
         
         if (data.success) {
-            displayRecentActivity(data.predictions.slice(0, 5));
+            displayRecentActivity(data.predictions);
         }
     } catch (error) {
         console.error('Error loading recent activity:', error);
@@ -0,0 +1,147 @@
+"""
+Decoded image container shared by validation and inference
+"""
+
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class DecodedImage:
+    """
+    An uploaded image decoded exactly once
+
+    Holds the RGB pixel buffer and derives the grayscale, BGR and HSV
+    views on first access, so every validation check and the CNN
+    preprocessing step can share one decode.
+    """
+
+    def __init__(self, rgb, file_size=None):
+        """
+        Args:
+            rgb: HxWx3 uint8 array in RGB channel order
+            file_size: Size of the encoded image in bytes, if known
+        """
+        self.rgb = np.ascontiguousarray(rgb, dtype=np.uint8)
+        self.file_size = file_size
+        self._bgr = None
+        self._gray = None
+        self._hsv = None
+        self._proxies = {}
+
+    @classmethod
+    def from_pil(cls, img, file_size=None):
+        """Build from an opened PIL image"""
+        return cls(np.asarray(img.convert('RGB')), file_size=file_size)
+
+    @classmethod
+    def from_bytes(cls, data, draft_size=None):
+        """
+        Decode an encoded image (JPEG, PNG, ...) held in memory
+
+        Args:
+            data: Encoded image bytes
+            draft_size: If set, let JPEG decoding downscale in the DCT domain
+                (PIL Image.draft) to the smallest size still covering
+                (width, height). Ignored for other formats.
+        """
+        with Image.open(io.BytesIO(data)) as img:
+            if draft_size is not None:
+                img.draft('RGB', draft_size)
+            return cls.from_pil(img, file_size=len(data))
+
+    @classmethod
+    def from_path(cls, path, draft_size=None):
+        """Decode an image file from disk (see from_bytes for draft_size)"""
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read(), draft_size=draft_size)
+
+    @classmethod
+    def from_array(cls, array):
+        """Wrap an RGB (or grayscale) numpy array"""
+        if array.ndim == 2:
+            array = cv2.cvtColor(array.astype(np.uint8), cv2.COLOR_GRAY2RGB)
+        return cls(array)
+
+    @property
+    def width(self):
+        return self.rgb.shape[1]
+
+    @property
+    def height(self):
+        return self.rgb.shape[0]
+
+    @property
+    def size(self):
+        """(width, height), matching PIL's Image.size"""
+        return self.width, self.height
+
+    @property
+    def bgr(self):
+        """BGR view for OpenCV routines that expect cv2.imread output"""
+        if self._bgr is None:
+            self._bgr = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR)
+        return self._bgr
+
+    @property
+    def gray(self):
+        """Single-channel grayscale view"""
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+        return self._gray
+
+    @property
+    def hsv(self):
+        """HSV view (OpenCV ranges: H 0-179, S/V 0-255)"""
+        if self._hsv is None:
+            self._hsv = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2HSV)
+        return self._hsv
+
+    def proxy(self, max_edge=512):
+        """
+        Downscaled copy whose long edge is at most max_edge pixels
+
+        Uses area interpolation by an integer factor, which averages whole
+        blocks of source pixels and hits OpenCV's fast path. Up to factor-1
+        trailing rows/columns are dropped. Images already within the limit
+        return themselves.
+        """
+        long_edge = max(self.width, self.height)
+        if long_edge <= max_edge:
+            return self
+        proxy = self._proxies.get(max_edge)
+        if proxy is None:
+            factor = -(-long_edge // max_edge)  # ceil division
+            height = self.height - self.height % factor
+            width = self.width - self.width % factor
+            reduced = cv2.resize(
+                self.rgb[:height, :width], (width // factor, height // factor), interpolation=cv2.INTER_AREA
+            )
+            proxy = DecodedImage(reduced, file_size=self.file_size)
+            self._proxies[max_edge] = proxy
+        return proxy
+
+    def to_pil(self):
+        """Return a PIL image sharing the RGB buffer"""
+        return Image.fromarray(self.rgb)
+
+
+def as_decoded_image(image):
+    """
+    Normalize a path, encoded bytes, numpy array or DecodedImage into a DecodedImage
+
+    Args:
+        image: Path to image file, encoded image bytes, RGB numpy array or DecodedImage
+
+    Returns:
+        DecodedImage instance
+    """
+    if isinstance(image, DecodedImage):
+        return image
+    if isinstance(image, str):
+        return DecodedImage.from_path(image)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return DecodedImage.from_bytes(bytes(image))
+    return DecodedImage.from_array(np.asarray(image))
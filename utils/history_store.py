@@ -0,0 +1,344 @@
+"""
+Append-only prediction history store
+Records are kept as JSON lines so adding a prediction is a single O(1) append
+"""
+
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process serving only
+    fcntl = None
+
+_SEQ_PATTERN = re.compile(r'^pred_(\d+)_')
+
+# Size of the per-user ring of most recent predictions kept for analytics
+RECENT_PREDICTIONS = 5
+
+
+def project(record, fields):
+    """Return only the requested top-level fields of a record (all if fields is None)"""
+    if fields is None or record is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+def _check_timestamp(value, name):
+    try:
+        datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an ISO 8601 timestamp") from None
+
+
+def migrate_json_history(legacy_path, path):
+    """
+    One-time migration from the old prediction_history.json array to JSON lines
+
+    The legacy file is left untouched; the new log is written to a temporary
+    file and moved into place atomically.
+
+    Returns:
+        Number of migrated records
+    """
+    with open(legacy_path, 'r') as f:
+        try:
+            history = json.load(f)
+        except ValueError:
+            history = []
+
+    # Unique temporary name in the target directory so os.replace stays atomic
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path))
+    )
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            for entry in history:
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    print(f"Migrated {len(history)} predictions from {legacy_path} to {path}")
+    return len(history)
+
+
+class HistoryStore:
+    """
+    JSON-lines prediction log with in-memory secondary indexes
+
+    Only the indexes live in memory; records are read from the log on demand.
+
+    Indexes:
+        prediction_id -> (byte offset, length) of the record in the log
+        user_id -> [(timestamp, prediction_id), ...] kept in time order
+
+    Running aggregates (per user and global) are updated on every append so
+    analytics never rescan the log.
+
+    Several processes (e.g. serve.py workers) may share one log: appends take
+    an exclusive flock, and every call first indexes records that other
+    processes appended since (one fstat when nothing changed).
+    """
+
+    def __init__(self, path, legacy_path=None):
+        """
+        Args:
+            path: JSON-lines log file
+            legacy_path: Old JSON array file migrated on first start
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._offsets = {}
+        self._order = []
+        self._by_user = {}
+        self._next_seq = 1
+        self._end = 0
+        self._aggregates = {}
+
+        if legacy_path and not os.path.exists(path) and os.path.exists(legacy_path):
+            self._migrate(legacy_path)
+        self._file = open(self.path, 'ab')
+        self._reader = open(self.path, 'rb')
+        self._catch_up()
+
+    def _migrate(self, legacy_path):
+        """Migrate the legacy file once, even when several processes start together"""
+        with open(self.path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                # Another process may have finished the migration while we waited
+                if not os.path.exists(self.path):
+                    migrate_json_history(legacy_path, self.path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _catch_up(self, writer=False):
+        """
+        Index complete records appended (by any process) since the last call
+
+        Args:
+            writer: Caller holds the append flock, so an unterminated final
+                line cannot be in progress and is a crash leftover
+        """
+        size = os.fstat(self._reader.fileno()).st_size
+        if size <= self._end:
+            return
+        with self._read_lock:
+            self._reader.seek(self._end)
+            data = self._reader.read(size - self._end)
+
+        offset = self._end
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b'\n'):
+                if writer:
+                    # Terminate the unfinished line so the next record starts cleanly
+                    self._file.write(b'\n')
+                    self._file.flush()
+                    try:
+                        self._index(json.loads(line), offset, len(line))
+                    except ValueError:
+                        pass
+                    offset += len(line) + 1
+                break
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash mid-append can leave a truncated line
+                    record = None
+                if record is not None:
+                    self._index(record, offset, len(line))
+            offset += len(line)
+        self._end = offset
+
+    def _sync(self):
+        with self._lock:
+            self._catch_up()
+
+    def _index(self, record, offset, length):
+        """Add one record to the indexes (O(log n) for in-order timestamps)"""
+        prediction_id = record.get('prediction_id')
+        if prediction_id in self._offsets:
+            self._offsets[prediction_id] = (offset, length)
+            return
+        self._order.append(prediction_id)
+        self._offsets[prediction_id] = (offset, length)
+        self._aggregate(record.get('user_id'), record)
+        self._aggregate(None, record)
+
+        user_index = self._by_user.setdefault(record.get('user_id'), [])
+        key = (record.get('timestamp', ''), prediction_id)
+        if not user_index or key >= user_index[-1]:
+            user_index.append(key)
+        else:
+            bisect.insort(user_index, key)
+
+        match = _SEQ_PATTERN.match(prediction_id or '')
+        if match:
+            self._next_seq = max(self._next_seq, int(match.group(1)) + 1)
+
+    def _aggregate(self, user_id, record):
+        aggregate = self._aggregates.get(user_id)
+        if aggregate is None:
+            aggregate = self._aggregates[user_id] = {
+                'total': 0,
+                'risk_levels': Counter(),
+                'conditions': Counter(),
+                'recent': []
+            }
+        aggregate['total'] += 1
+        aggregate['risk_levels'][record.get('risk_level')] += 1
+        aggregate['conditions'][record.get('condition', 'Unknown')] += 1
+
+        # Newest RECENT_PREDICTIONS by timestamp, kept sorted oldest first;
+        # among equal timestamps the earlier append ranks as newer, matching
+        # a stable newest-first sort of the whole log
+        recent = aggregate['recent']
+        key = (record.get('timestamp', ''), -aggregate['total'])
+        if len(recent) < RECENT_PREDICTIONS:
+            bisect.insort(recent, (key, record))
+        elif key > recent[0][0]:
+            recent.pop(0)
+            bisect.insort(recent, (key, record))
+
+    def _read_at(self, offset, length):
+        with self._read_lock:
+            self._reader.seek(offset)
+            return json.loads(self._reader.read(length))
+
+    def append(self, entry):
+        """
+        Append a prediction record
+
+        If entry['prediction_id'] is empty, a unique 'pred_<seq>_<YYYYmmddHHMMSS>'
+        id is assigned from the entry timestamp.
+
+        Returns:
+            The stored prediction id
+        """
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                # Ids must follow appends made by other processes
+                self._catch_up(writer=True)
+                if not entry.get('prediction_id'):
+                    stamp = re.sub(r'\D', '', entry.get('timestamp', ''))[:14]
+                    entry['prediction_id'] = f"pred_{self._next_seq}_{stamp}"
+                line = (json.dumps(entry) + '\n').encode('utf-8')
+                self._file.write(line)
+                self._file.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._index(entry, self._end, len(line))
+            self._end += len(line)
+            return entry['prediction_id']
+
+    def get(self, prediction_id):
+        """Look up a prediction by id in O(1) (None if missing)"""
+        self._sync()
+        location = self._offsets.get(prediction_id)
+        if location is None:
+            return None
+        return self._read_at(*location)
+
+    def count_for_user(self, user_id):
+        self._sync()
+        return len(self._by_user.get(user_id, []))
+
+    def page_for_user(self, user_id, limit=None, before=None, cursor=None):
+        """
+        A slice of a user's predictions, newest first
+
+        Only the records in the slice are read from the log.
+
+        Args:
+            user_id: Owner of the predictions
+            limit: Maximum number of records (None = no limit)
+            before: Only predictions with a timestamp strictly before this ISO string
+            cursor: Opaque next_cursor from a previous page (takes precedence over before)
+
+        Returns:
+            Tuple (records, next_cursor); next_cursor is None on the last page
+
+        Raises:
+            ValueError: If cursor is not a next_cursor value or before is not an ISO timestamp
+        """
+        if cursor:
+            timestamp, separator, prediction_id = cursor.partition('|')
+            if not separator or not prediction_id:
+                raise ValueError('cursor is not a valid next_cursor value')
+            _check_timestamp(timestamp, 'cursor')
+        elif before:
+            _check_timestamp(before, 'before')
+
+        self._sync()
+        index = self._by_user.get(user_id, [])
+        end = len(index)
+        if cursor:
+            end = bisect.bisect_left(index, (timestamp, prediction_id))
+        elif before:
+            end = bisect.bisect_left(index, (before,))
+        start = 0 if limit is None else max(0, end - limit)
+
+        keys = index[start:end]
+        records = [self.get(prediction_id) for _, prediction_id in reversed(keys)]
+        next_cursor = f"{keys[0][0]}|{keys[0][1]}" if keys and start > 0 else None
+        return records, next_cursor
+
+    def summary(self, user_id=None):
+        """
+        O(1) analytics from the running aggregates
+
+        Args:
+            user_id: Restrict to one user (None = all users)
+
+        Returns:
+            Dictionary with totals, risk-level counts, condition distribution
+            and the most recent predictions (newest first)
+        """
+        with self._lock:
+            self._catch_up()
+            aggregate = self._aggregates.get(user_id)
+            if aggregate is None:
+                return {
+                    'total_predictions': 0,
+                    'high_risk_count': 0,
+                    'medium_risk_count': 0,
+                    'low_risk_count': 0,
+                    'condition_distribution': {},
+                    'recent_predictions': []
+                }
+            return {
+                'total_predictions': aggregate['total'],
+                'high_risk_count': aggregate['risk_levels']['High'],
+                'medium_risk_count': aggregate['risk_levels']['Medium'],
+                'low_risk_count': aggregate['risk_levels']['Low'],
+                'condition_distribution': dict(aggregate['conditions']),
+                'recent_predictions': [record for _, record in reversed(aggregate['recent'])]
+            }
+
+    def all(self):
+        """Every prediction in append order (reads the whole log)"""
+        self._sync()
+        return [self.get(prediction_id) for prediction_id in self._order]
+
+    def __len__(self):
+        self._sync()
+        return len(self._order)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+            self._reader.close()
@@ -0,0 +1,110 @@
+"""
+Header-only image preflight
+Reads format, dimensions and EXIF orientation without decoding any pixels,
+so oversized or unsupported uploads are rejected before a buffer is allocated
+"""
+
+import io
+import warnings
+
+from PIL import Image
+
+# Formats accepted by the app, as reported by PIL (matches ALLOWED_EXTENSIONS)
+ALLOWED_FORMATS = {'PNG', 'JPEG', 'GIF', 'BMP'}
+
+# Largest accepted image in pixels (50 MP covers current phone cameras);
+# a 50 MP RGB buffer is already ~150 MB once decoded
+MAX_IMAGE_PIXELS = 50_000_000
+
+# EXIF orientations that rotate the image by 90 or 270 degrees
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+_EXIF_ORIENTATION_TAG = 0x0112
+
+
+def read_image_header(source):
+    """
+    Read an image header from bytes or a seekable stream
+
+    PIL parses only the header (and JPEG APP segments for EXIF) on open;
+    pixel data is never decoded. Streams are rewound afterwards.
+
+    Args:
+        source: Encoded image bytes or a binary file-like object
+
+    Returns:
+        Dictionary with format, mode, resolution (width, height as stored),
+        orientation (EXIF tag value, 1 if absent) and display_resolution
+        (width, height after applying the orientation)
+    """
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    start = stream.tell()
+    try:
+        with warnings.catch_warnings():
+            # Size limits are enforced by preflight_image, not PIL's warning
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(stream) as img:
+                width, height = img.size
+                try:
+                    orientation = int(img.getexif().get(_EXIF_ORIENTATION_TAG, 1))
+                except Exception:
+                    orientation = 1
+                header = {
+                    'format': img.format,
+                    'mode': img.mode,
+                    'resolution': (width, height),
+                    'orientation': orientation
+                }
+    finally:
+        stream.seek(start)
+
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        header['display_resolution'] = (height, width)
+    else:
+        header['display_resolution'] = (width, height)
+    return header
+
+
+def preflight_image(source, max_pixels=MAX_IMAGE_PIXELS, allowed_formats=ALLOWED_FORMATS):
+    """
+    Reject unreadable, unsupported or decompression-bomb images from the header alone
+
+    Args:
+        source: Encoded image bytes or a binary file-like object
+        max_pixels: Largest accepted width * height (None = no limit)
+        allowed_formats: PIL format names accepted (None = any)
+
+    Returns:
+        Dictionary with is_valid, errors and header (None if unreadable)
+    """
+    results = {
+        'is_valid': True,
+        'errors': [],
+        'header': None
+    }
+
+    try:
+        header = read_image_header(source)
+    except Image.DecompressionBombError:
+        # PIL refuses to even open images far beyond its own limit
+        results['is_valid'] = False
+        results['errors'].append('Image dimensions are too large to process.')
+        return results
+    except Exception:
+        results['is_valid'] = False
+        results['errors'].append('File is not a readable image.')
+        return results
+
+    results['header'] = header
+
+    if allowed_formats is not None and header['format'] not in allowed_formats:
+        results['is_valid'] = False
+        results['errors'].append(f"Unsupported image format: {header['format']}. Allowed: {', '.join(sorted(allowed_formats))}")
+
+    width, height = header['resolution']
+    if max_pixels is not None and width * height > max_pixels:
+        results['is_valid'] = False
+        results['errors'].append(
+            f'Image dimensions ({width}x{height}) exceed the maximum of {max_pixels // 1_000_000} megapixels.'
+        )
+
+    return results
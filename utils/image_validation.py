@@ -3,31 +3,48 @@ Image quality validation utilities
 """
 
 import cv2
+import io
 import numpy as np
 from PIL import Image
 import os
 
+from utils.decoded_image import as_decoded_image
+
+# Proxy validation for large uploads. Brightness, contrast and color spread
+# are measured on an area-downscaled copy with a PROXY_MAX_EDGE long edge.
+# Blur (Laplacian variance) and Canny edge density depend on pixel scale: a
+# blur of a few pixels at 12 MP vanishes at 512 px, so no proxy threshold
+# can recover it. Those two are measured instead on a PROXY_TILE_GRID x
+# PROXY_TILE_GRID grid of full-resolution tiles, which keeps the original
+# thresholds valid. Check agreement with `python benchmark_validation.py`.
+PROXY_MAX_EDGE = 512
+PROXY_TILE_SIZE = 256
+PROXY_TILE_GRID = 3
+
+# Laplacian variance below which an image is rejected as blurry
+BLUR_THRESHOLD = 100
+
+# With stop_on_error, blur is first estimated on the full-resolution tiles.
+# Scores outside BLUR_THRESHOLD x this band decide immediately; scores inside
+# it are confirmed on the whole image.
+BLUR_CONFIRM_BAND = (0.5, 2.0)
+
 def calculate_blur_score(image_path_or_array):
     """
     Calculate blur score using Laplacian variance
     
     Args:
-        image_path_or_array: Path to image or numpy array
+        image_path_or_array: Path to image, numpy array or DecodedImage
     
     Returns:
         Blur score (higher = less blurry)
     """
-    # Load image
-    if isinstance(image_path_or_array, str):
-        img = cv2.imread(image_path_or_array)
-    else:
-        img = cv2.cvtColor(image_path_or_array, cv2.COLOR_RGB2BGR)
-    
-    if img is None:
+    try:
+        image = as_decoded_image(image_path_or_array)
+    except Exception:
         return 0
     
-    # Convert to grayscale
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = image.gray
     
     # Calculate Laplacian variance
     laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
@@ -39,20 +56,15 @@ def calculate_brightness(image_path_or_array):
     Calculate average brightness of image
     
     Args:
-        image_path_or_array: Path to image or numpy array
+        image_path_or_array: Path to image, numpy array or DecodedImage
     
     Returns:
         Average brightness (0-255)
     """
-    # Load image
-    if isinstance(image_path_or_array, str):
-        img = Image.open(image_path_or_array).convert('RGB')
-        img_array = np.array(img)
-    else:
-        img_array = image_path_or_array
+    image = as_decoded_image(image_path_or_array)
     
     # Calculate average brightness
-    brightness = np.mean(img_array)
+    brightness = np.mean(image.rgb)
     
     return brightness
 
@@ -61,19 +73,21 @@ def check_resolution(image_path_or_array, min_resolution=(224, 224)):
     Check if image meets minimum resolution requirements
     
     Args:
-        image_path_or_array: Path to image or numpy array
+        image_path_or_array: Path to image, encoded bytes, numpy array or DecodedImage
         min_resolution: Minimum (width, height) required
     
     Returns:
         Tuple (meets_requirement, actual_resolution)
     """
-    # Load image
-    if isinstance(image_path_or_array, str):
-        img = Image.open(image_path_or_array)
+    if isinstance(image_path_or_array, (str, bytes, bytearray)):
+        # Only the header is read for a path or encoded bytes
+        source = image_path_or_array
+        if not isinstance(source, str):
+            source = io.BytesIO(source)
+        with Image.open(source) as img:
+            width, height = img.size
     else:
-        img = Image.fromarray(image_path_or_array)
-    
-    width, height = img.size
+        width, height = as_decoded_image(image_path_or_array).size
     min_width, min_height = min_resolution
     
     meets_requirement = width >= min_width and height >= min_height
@@ -86,23 +100,19 @@ def detect_pimple_acne(image_path_or_array):
     Pimples have distinct characteristics: raised bumps, red/pink color, circular shape
     
     Args:
-        image_path_or_array: Path to image or numpy array
+        image_path_or_array: Path to image, numpy array or DecodedImage
     
     Returns:
         Dictionary with pimple detection results
     """
     try:
-        # Load image
-        if isinstance(image_path_or_array, str):
-            img = cv2.imread(image_path_or_array)
-        else:
-            img = cv2.cvtColor(image_path_or_array, cv2.COLOR_RGB2BGR)
-        
-        if img is None:
+        try:
+            image = as_decoded_image(image_path_or_array)
+        except Exception:
             return {'is_pimple': False, 'confidence': 0.0, 'reason': 'Could not load image'}
         
-        # Convert to HSV for better color analysis
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        # HSV gives better color analysis
+        hsv = image.hsv
         
         # Detect red/pink colors (typical of pimples)
         # Red range in HSV: (0-10, 100-255, 50-255) and (170-180, 100-255, 50-255)
@@ -116,10 +126,10 @@ def detect_pimple_acne(image_path_or_array):
         red_mask = cv2.bitwise_or(mask_red1, mask_red2)
         
         # Calculate red/pink pixel percentage
-        red_pixel_ratio = np.sum(red_mask > 0) / (img.shape[0] * img.shape[1])
+        red_pixel_ratio = np.sum(red_mask > 0) / (image.height * image.width)
         
         # Detect circular/round shapes (pimples are typically round)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = image.gray
         
         # Apply Gaussian blur to reduce noise
         blurred = cv2.GaussianBlur(gray, (9, 9), 2)
@@ -194,29 +204,69 @@ def detect_pimple_acne(image_path_or_array):
             'reason': f'Could not analyze for pimples: {str(e)}'
         }
 
+def classify_lesion(std_dev, edge_density, hue_std, saturation_std):
+    """
+    Turn contrast, edge and color statistics into a lesion detection result
+    
+    Args:
+        std_dev: Standard deviation of the grayscale image
+        edge_density: Fraction of Canny edge pixels
+        hue_std: Standard deviation of the HSV hue channel
+        saturation_std: Standard deviation of the HSV saturation channel
+    
+    Returns:
+        Dictionary with lesion detection results
+    """
+    # Combined score for lesion detection
+    # Higher values indicate presence of lesion-like features
+    lesion_score = (std_dev / 50.0) + (edge_density * 100) + (hue_std / 10.0) + (saturation_std / 50.0)
+    
+    # Stricter threshold: if score is too low, likely clear skin without visible lesion
+    # Lower threshold = more sensitive to clear skin detection
+    has_lesion = lesion_score > 3.0  # Increased threshold - clearer distinction
+    confidence = min(lesion_score / 8.0, 1.0)  # Adjusted confidence calculation
+    
+    # Additional check: if std_dev is very low, it's likely clear/uniform skin
+    if std_dev < 12:
+        has_lesion = False
+        confidence = max(0.0, confidence - 0.3)  # Reduce confidence for clear skin
+    
+    reason = ""
+    if not has_lesion:
+        if std_dev < 15:
+            reason = "Image appears to show clear/uniform skin without visible lesions"
+        elif edge_density < 0.01:
+            reason = "No distinct features or lesions detected in the image"
+        else:
+            reason = "Image may not contain a visible skin lesion"
+    
+    return {
+        'has_lesion': bool(has_lesion),
+        'confidence': float(confidence),
+        'lesion_score': float(lesion_score),
+        'std_dev': float(std_dev),
+        'edge_density': float(edge_density),
+        'reason': reason
+    }
+
 def detect_skin_lesion(image_path_or_array):
     """
     Detect if image contains a visible skin lesion
     Uses edge detection and contrast analysis to identify lesions
     
     Args:
-        image_path_or_array: Path to image or numpy array
+        image_path_or_array: Path to image, numpy array or DecodedImage
     
     Returns:
         Dictionary with lesion detection results
     """
     try:
-        # Load image
-        if isinstance(image_path_or_array, str):
-            img = cv2.imread(image_path_or_array)
-        else:
-            img = cv2.cvtColor(image_path_or_array, cv2.COLOR_RGB2BGR)
-        
-        if img is None:
+        try:
+            image = as_decoded_image(image_path_or_array)
+        except Exception:
             return {'has_lesion': False, 'confidence': 0.0, 'reason': 'Could not load image'}
         
-        # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        gray = image.gray
         
         # Calculate standard deviation (contrast measure)
         # Clear skin has low contrast, lesions have higher contrast
@@ -227,41 +277,11 @@ def detect_skin_lesion(image_path_or_array):
         edge_density = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
         
         # Calculate color variance (lesions often have different colors)
-        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        hsv = image.hsv
         hue_std = np.std(hsv[:, :, 0])
         saturation_std = np.std(hsv[:, :, 1])
         
-        # Combined score for lesion detection
-        # Higher values indicate presence of lesion-like features
-        lesion_score = (std_dev / 50.0) + (edge_density * 100) + (hue_std / 10.0) + (saturation_std / 50.0)
-        
-        # Stricter threshold: if score is too low, likely clear skin without visible lesion
-        # Lower threshold = more sensitive to clear skin detection
-        has_lesion = lesion_score > 3.0  # Increased threshold - clearer distinction
-        confidence = min(lesion_score / 8.0, 1.0)  # Adjusted confidence calculation
-        
-        # Additional check: if std_dev is very low, it's likely clear/uniform skin
-        if std_dev < 12:
-            has_lesion = False
-            confidence = max(0.0, confidence - 0.3)  # Reduce confidence for clear skin
-        
-        reason = ""
-        if not has_lesion:
-            if std_dev < 15:
-                reason = "Image appears to show clear/uniform skin without visible lesions"
-            elif edge_density < 0.01:
-                reason = "No distinct features or lesions detected in the image"
-            else:
-                reason = "Image may not contain a visible skin lesion"
-        
-        return {
-            'has_lesion': has_lesion,
-            'confidence': float(confidence),
-            'lesion_score': float(lesion_score),
-            'std_dev': float(std_dev),
-            'edge_density': float(edge_density),
-            'reason': reason
-        }
+        return classify_lesion(std_dev, edge_density, hue_std, saturation_std)
     
     except Exception as e:
         return {
@@ -270,12 +290,132 @@ def detect_skin_lesion(image_path_or_array):
             'reason': f'Could not analyze image: {str(e)}'
         }
 
-def validate_image_quality(image_path_or_array):
+def _sample_tiles(image, tile_size, grid):
+    """Evenly spaced full-resolution grayscale tiles covering the image"""
+    tile_h = min(tile_size, image.height)
+    tile_w = min(tile_size, image.width)
+    tiles = []
+    for row in range(grid):
+        top = int((row + 0.5) * image.height / grid - tile_h / 2)
+        top = min(max(top, 0), image.height - tile_h)
+        for col in range(grid):
+            left = int((col + 0.5) * image.width / grid - tile_w / 2)
+            left = min(max(left, 0), image.width - tile_w)
+            tiles.append(cv2.cvtColor(image.rgb[top:top + tile_h, left:left + tile_w], cv2.COLOR_RGB2GRAY))
+    return tiles
+
+def _laplacian_variance(grays):
+    """
+    Laplacian variance pooled over one or more grayscale images
+    
+    Per-image sums are combined so the result equals the variance of all
+    pixels taken together.
+    """
+    pixels = 0
+    lap_sum = 0.0
+    lap_sq_sum = 0.0
+    for gray in grays:
+        # Laplacian of uint8 input is exact in float32
+        lap_mean, lap_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+        n = gray.size
+        pixels += n
+        lap_sum += lap_mean[0, 0] * n
+        lap_sq_sum += (lap_std[0, 0] ** 2 + lap_mean[0, 0] ** 2) * n
+    lap_mean = lap_sum / pixels
+    return float(lap_sq_sum / pixels - lap_mean ** 2)
+
+def _edge_density(grays):
+    """Fraction of Canny edge pixels pooled over one or more grayscale images"""
+    edge_pixels = sum(cv2.countNonZero(cv2.Canny(gray, 50, 150)) for gray in grays)
+    return edge_pixels / float(sum(gray.size for gray in grays))
+
+def _sampled_blur_score(image):
+    """
+    Tile-sampled blur score when it is decisive, else None
+    
+    Returns None for images barely larger than the sampled tiles (a full
+    measurement costs about the same) and for scores inside BLUR_CONFIRM_BAND.
+    """
+    if image.width * image.height <= 2 * (PROXY_TILE_SIZE * PROXY_TILE_GRID) ** 2:
+        return None
+    score = _laplacian_variance(_sample_tiles(image, PROXY_TILE_SIZE, PROXY_TILE_GRID))
+    low, high = BLUR_CONFIRM_BAND
+    if BLUR_THRESHOLD * low <= score < BLUR_THRESHOLD * high:
+        return None
+    return score
+
+def _measurement_views(full_image, proxy_max_edge):
+    """
+    Pick the images statistics are measured on
+    
+    Returns:
+        Tuple (image for color/contrast, grayscale images for blur/edges, uses proxy)
+    """
+    image = full_image.proxy(proxy_max_edge) if proxy_max_edge else full_image
+    if image is full_image:
+        return image, [image.gray], False
+    return image, _sample_tiles(full_image, PROXY_TILE_SIZE, PROXY_TILE_GRID), True
+
+def _appearance_statistics(image):
+    """Brightness, contrast and color spread of an image"""
+    _, gray_std = cv2.meanStdDev(image.gray)
+    _, hsv_std = cv2.meanStdDev(image.hsv)
+    rgb_mean = cv2.mean(image.rgb)
+    return {
+        'brightness': (rgb_mean[0] + rgb_mean[1] + rgb_mean[2]) / 3.0,
+        'std_dev': float(gray_std[0, 0]),
+        'hue_std': float(hsv_std[0, 0]),
+        'saturation_std': float(hsv_std[1, 0])
+    }
+
+def compute_image_statistics(image_path_or_array, proxy_max_edge=None):
+    """
+    Compute every statistic used by the quality checks in a single pass
+    
+    Shares one grayscale and one HSV conversion and uses OpenCV reductions
+    (meanStdDev, countNonZero) instead of separate NumPy passes, so no
+    temporary boolean or float64 copies of the image are allocated.
+    
+    Args:
+        image_path_or_array: Path to image, encoded bytes, numpy array or DecodedImage
+        proxy_max_edge: If set and the image is larger, measure color and
+            contrast on a downscaled proxy and blur/edges on full-resolution
+            tiles (see PROXY_MAX_EDGE)
+    
+    Returns:
+        Dictionary with resolution, blur_score, brightness, std_dev,
+        edge_density, hue_std, saturation_std and proxy (bool)
+    """
+    full_image = as_decoded_image(image_path_or_array)
+    image, grays, use_proxy = _measurement_views(full_image, proxy_max_edge)
+    
+    stats = {
+        'resolution': full_image.size,
+        'blur_score': _laplacian_variance(grays),
+        'edge_density': _edge_density(grays),
+        'proxy': use_proxy
+    }
+    stats.update(_appearance_statistics(image))
+    return stats
+
+def validate_image_quality(image_path_or_array, proxy_max_edge=None, stop_on_error=False):
     """
     Comprehensive image quality validation
     
+    Checks run in stages ordered by cost: resolution (header only for paths
+    and encoded bytes), decode, blur, then brightness and lesion detection.
+    The image is decoded once, so callers that already hold a DecodedImage
+    pay no decode cost.
+    
     Args:
-        image_path_or_array: Path to image or numpy array
+        image_path_or_array: Path to image, encoded bytes, numpy array or DecodedImage
+        proxy_max_edge: Validate on a downscaled proxy with this long edge
+            (e.g. PROXY_MAX_EDGE) instead of at full resolution
+        stop_on_error: Return as soon as a check makes the image invalid. The
+            checks that were not run are listed under 'skipped_checks'. Blur
+            is then estimated on full-resolution tiles first and measured on
+            the whole image only for borderline scores ('blur_sampled' is
+            True when the estimate decided)
     
     Returns:
         Dictionary with validation results
@@ -298,23 +438,39 @@ def validate_image_quality(image_path_or_array):
                 results['errors'].append('Image file not found')
                 return results
         
-        # Check resolution
-        meets_res, resolution = check_resolution(image_path_or_array)
+        # Stage 1: resolution, read from the header before any pixel decode
+        meets_resolution, resolution = check_resolution(image_path_or_array)
         results['resolution'] = resolution
         
-        if not meets_res:
+        if not meets_resolution:
             results['warnings'].append(f'Image resolution ({resolution[0]}x{resolution[1]}) is below recommended minimum (224x224)')
         
-        # Check blur
-        blur_score = calculate_blur_score(image_path_or_array)
+        # Stage 2: decode
+        full_image = as_decoded_image(image_path_or_array)
+        
+        # Stage 3: blur, the only check that rejects an image. Early exit
+        # tries the tile-sampled estimate before any full-image pass
+        views = None
+        blur_score = None
+        if stop_on_error and not proxy_max_edge:
+            blur_score = _sampled_blur_score(full_image)
+            results['blur_sampled'] = blur_score is not None
+        if blur_score is None:
+            views = _measurement_views(full_image, proxy_max_edge)
+            blur_score = _laplacian_variance(views[1])
         results['blur_score'] = blur_score
         
-        if blur_score < 100:  # Threshold for blur detection
+        if blur_score < BLUR_THRESHOLD:
             results['is_valid'] = False
             results['errors'].append('Image is too blurry. Please take a clearer photo.')
+            if stop_on_error:
+                results['skipped_checks'] = ['brightness', 'lesion_detection']
+                return results
         
-        # Check brightness
-        brightness = calculate_brightness(image_path_or_array)
+        # Stage 4: brightness and lesion detection
+        image, grays, _ = views or _measurement_views(full_image, proxy_max_edge)
+        stats = _appearance_statistics(image)
+        brightness = stats['brightness']
         results['brightness'] = brightness
         
         if brightness < 50:
@@ -323,15 +479,17 @@ def validate_image_quality(image_path_or_array):
             results['warnings'].append('Image is too bright. May affect detection accuracy.')
         
         # Detect if image contains a visible skin lesion
-        lesion_detection = detect_skin_lesion(image_path_or_array)
+        lesion_detection = classify_lesion(
+            stats['std_dev'], _edge_density(grays), stats['hue_std'], stats['saturation_std']
+        )
         results['lesion_detection'] = lesion_detection
         
         if not lesion_detection['has_lesion']:
             results['warnings'].append(lesion_detection['reason'])
         
-        # Check file size (if path provided)
-        if isinstance(image_path_or_array, str):
-            file_size = os.path.getsize(image_path_or_array) / (1024 * 1024)  # MB
+        # Check file size (if known)
+        if full_image.file_size is not None:
+            file_size = full_image.file_size / (1024 * 1024)  # MB
             if file_size > 10:
                 results['warnings'].append('Image file is very large. Processing may be slow.')
         
@@ -340,4 +498,3 @@ def validate_image_quality(image_path_or_array):
         results['errors'].append(f'Error validating image: {str(e)}')
     
     return results
-
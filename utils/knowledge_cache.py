@@ -0,0 +1,99 @@
+"""
+Pre-serialized JSON payloads for static knowledge endpoints
+Payloads are built and encoded once, tagged with a strong ETag, and rebuilt
+only when the file they come from changes
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+
+class CachedPayload:
+    """An encoded JSON body and its strong ETag"""
+
+    def __init__(self, body, signature=None):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.signature = signature
+
+
+def file_signature(path):
+    """(mtime_ns, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class KnowledgeCache:
+    """
+    Memoized knowledge payloads
+
+    Payloads derived from a file are keyed on its (mtime, size), so editing
+    the file invalidates them on the next request; the check costs one stat.
+    """
+
+    def __init__(self, dumps=json.dumps):
+        """
+        Args:
+            dumps: Function encoding a payload to a JSON string (e.g. app.json.dumps)
+        """
+        self._dumps = dumps
+        self._entries = {}
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, build, source=None):
+        """
+        Encoded payload for key
+
+        Args:
+            key: Cache key (e.g. 'medical-info:pimples')
+            build: Called with no arguments to produce the payload on a miss
+            source: File the payload is derived from; a change rebuilds it
+
+        Returns:
+            CachedPayload
+        """
+        signature = file_signature(source) if source else None
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry.signature == signature:
+            return entry
+
+        entry = CachedPayload((self._dumps(build()) + '\n').encode('utf-8'), signature)
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def load_json(self, path):
+        """
+        Parsed contents of a JSON file, re-read only when it changes
+
+        The returned object is shared between callers and must not be modified.
+        Missing or invalid files give {}.
+        """
+        signature = file_signature(path)
+        with self._lock:
+            cached = self._files.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        data = {}
+        if signature is not None:
+            try:
+                with open(path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = {}
+        with self._lock:
+            self._files[path] = (signature, data)
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._files.clear()
@@ -0,0 +1,27 @@
+"""
+Shared helpers for the runtime metrics endpoints
+"""
+
+import numpy as np
+
+
+def percentile_summary(samples):
+    """
+    p50/p90/p99/max of a set of samples
+
+    Args:
+        samples: Sequence or array of numbers (e.g. times in milliseconds)
+
+    Returns:
+        Dictionary with p50, p90, p99 and max (all 0.0 when there are no samples)
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if not samples.size:
+        return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+    p50, p90, p99 = np.percentile(samples, (50, 90, 99))
+    return {
+        'p50': float(p50),
+        'p90': float(p90),
+        'p99': float(p99),
+        'max': float(samples.max())
+    }
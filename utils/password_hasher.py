@@ -0,0 +1,116 @@
+"""
+Bounded executor for password hashing
+Runs the deliberately slow KDFs behind login and registration on a small
+dedicated pool, so an auth burst uses at most a fixed number of cores
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from utils.metrics import percentile_summary
+
+# werkzeug method string for new hashes; cost is encoded in each hash, so
+# changing it only affects passwords hashed afterwards
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class PasswordHasherSaturated(RuntimeError):
+    """Raised when max_pending hashing jobs are already queued or running"""
+
+
+class PasswordHasher:
+    """
+    Thread pool for generate_password_hash / check_password_hash
+
+    hashlib's scrypt and PBKDF2 release the GIL, so max_workers threads use
+    up to max_workers cores and no more. At most max_pending jobs may be
+    queued or running; further calls raise PasswordHasherSaturated.
+    """
+
+    def __init__(self, max_workers=2, max_pending=64, method=DEFAULT_METHOD, metrics_window=1000):
+        """
+        Args:
+            max_workers: Concurrent hashing jobs (cores available to auth)
+            max_pending: Maximum jobs queued or running at once
+            method: werkzeug hash method for new passwords, e.g.
+                'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'
+            metrics_window: Number of recent samples kept for percentiles
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.method = method
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hasher')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+        self._metrics_lock = threading.Lock()
+        self._queue_waits = deque(maxlen=metrics_window)
+        self._run_times = deque(maxlen=metrics_window)
+        self._pending = 0
+        self._total = 0
+        self._rejected = 0
+
+    def hash(self, password):
+        """Hash a new password with the configured method"""
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def check(self, pwhash, password):
+        """Verify a password against a stored hash"""
+        return self._run(check_password_hash, pwhash, password)
+
+    def _run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            with self._metrics_lock:
+                self._rejected += 1
+            raise PasswordHasherSaturated('Password hashing queue is full')
+
+        with self._metrics_lock:
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finished = time.perf_counter()
+                with self._metrics_lock:
+                    self._queue_waits.append(started - submitted)
+                    self._run_times.append(finished - started)
+
+        try:
+            return self._executor.submit(job).result()
+        finally:
+            with self._metrics_lock:
+                self._pending -= 1
+                self._total += 1
+            self._slots.release()
+
+    def get_metrics(self):
+        """
+        Queue depth, rejections and queue/run time percentiles
+
+        Returns:
+            Dictionary of counters and times in milliseconds
+        """
+        with self._metrics_lock:
+            waits = np.array(self._queue_waits, dtype=np.float64) * 1000.0
+            runs = np.array(self._run_times, dtype=np.float64) * 1000.0
+            metrics = {
+                'method': self.method,
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'total': self._total,
+                'rejected': self._rejected
+            }
+        metrics['queue_wait_ms'] = percentile_summary(waits)
+        metrics['hash_ms'] = percentile_summary(runs)
+        return metrics
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
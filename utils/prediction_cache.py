@@ -0,0 +1,104 @@
+"""
+Content-addressed cache for validation and prediction results
+Repeated uploads of the same image bytes skip decoding, validation and inference
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """
+    LRU + TTL cache keyed by image content hash and model version
+
+    Each entry stores the validation result and, once computed, the
+    predict() result for that image. Stored and returned values are deep
+    copies so callers may annotate them freely.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600):
+        """
+        Args:
+            max_entries: Maximum number of cached images (least recently used evicted)
+            ttl_seconds: Entry lifetime in seconds (None = no expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image_bytes, model_version):
+        """Cache key for the given encoded image and model version"""
+        return f"{model_version}:{hashlib.sha256(image_bytes).hexdigest()}"
+
+    def get(self, key):
+        """
+        Look up an entry
+
+        Returns:
+            Dictionary with 'validation' and 'prediction' keys (either may be None),
+            or None on a miss
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and self._expired(item):
+                del self._entries[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(item['value'])
+
+    def put(self, key, validation=None, prediction=None):
+        """Store (or extend) the cached results for an image"""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or self._expired(item):
+                item = {'value': {'validation': None, 'prediction': None}}
+            if validation is not None:
+                item['value']['validation'] = copy.deepcopy(validation)
+            if prediction is not None:
+                item['value']['prediction'] = copy.deepcopy(prediction)
+            item['stored_at'] = time.monotonic()
+            self._entries[key] = item
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *args):
+        """
+        Drop every cached entry
+
+        Accepts and ignores arguments so it can be registered directly as a
+        model reload listener.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def _expired(self, item):
+        return self.ttl_seconds is not None and time.monotonic() - item['stored_at'] > self.ttl_seconds
+
+    def get_stats(self):
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
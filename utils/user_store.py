@@ -0,0 +1,147 @@
+"""
+SQLite-backed user repository
+Replaces users.json: lookups use the username and email indexes, and each
+registration is a single atomic insert instead of a whole-file rewrite
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    password TEXT NOT NULL
+)
+"""
+
+
+class DuplicateUserError(ValueError):
+    """Raised by UserStore.add when the username or email is taken"""
+
+    def __init__(self, field):
+        super().__init__(f"{field} already exists")
+        self.field = field
+
+
+def migrate_json_users(legacy_path, store):
+    """
+    One-time import of the old users.json mapping into a UserStore
+
+    The legacy file is left untouched. Users already in the store are skipped.
+
+    Returns:
+        Number of imported users
+    """
+    with open(legacy_path, 'r') as f:
+        try:
+            users = json.load(f)
+        except ValueError:
+            users = {}
+
+    with store._transaction() as conn:
+        before = conn.total_changes
+        conn.executemany(
+            'INSERT OR IGNORE INTO users (username, email, password) VALUES (?, ?, ?)',
+            [(username, user.get('email', ''), user.get('password', '')) for username, user in users.items()]
+        )
+        imported = conn.total_changes - before
+    print(f"Migrated {imported} users from {legacy_path} to {store.path}")
+    return imported
+
+
+class UserStore:
+    """
+    User records in SQLite with a read-through cache
+
+    Username is the primary key and email has a UNIQUE index, so both
+    lookups are O(log n) and concurrent registrations (threads or worker
+    processes) cannot create duplicates. Users are never modified once
+    added, so cached records stay valid.
+    """
+
+    def __init__(self, path, legacy_path=None):
+        """
+        Args:
+            path: SQLite database file
+            legacy_path: Old users.json imported when the database is new
+        """
+        self.path = path
+        self._local = threading.local()
+        self._cache = {}
+        self._lock = threading.Lock()
+
+        is_new = not os.path.exists(path)
+        with self._transaction() as conn:
+            conn.execute(_SCHEMA)
+        if is_new and legacy_path and os.path.exists(legacy_path):
+            migrate_json_users(legacy_path, self)
+
+    def _connection(self):
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers proceed while another process writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        """Connection as a context manager: commit on success, roll back on error"""
+        return self._connection()
+
+    def get(self, username):
+        """User record {'username', 'email', 'password'} or None"""
+        with self._lock:
+            user = self._cache.get(username)
+        if user is not None:
+            return dict(user)
+
+        row = self._connection().execute(
+            'SELECT username, email, password FROM users WHERE username = ?', (username,)
+        ).fetchone()
+        if row is None:
+            return None
+        user = dict(row)
+        with self._lock:
+            self._cache[username] = user
+        return dict(user)
+
+    def get_by_email(self, email):
+        """User record with this email, or None"""
+        row = self._connection().execute(
+            'SELECT username, email, password FROM users WHERE email = ?', (email,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def add(self, username, email, password_hash):
+        """
+        Register a user atomically
+
+        Raises:
+            DuplicateUserError: If the username or email is already registered
+        """
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    'INSERT INTO users (username, email, password) VALUES (?, ?, ?)',
+                    (username, email, password_hash)
+                )
+        except sqlite3.IntegrityError as e:
+            raise DuplicateUserError('email' if 'email' in str(e) else 'username') from e
+
+        with self._lock:
+            self._cache[username] = {'username': username, 'email': email, 'password': password_hash}
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,162 @@
+"""
+Process pool for CPU-bound image validation
+Keeps OpenCV/NumPy validation off the Flask request threads so it runs in
+parallel with CNN preprocessing instead of contending for the GIL
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+class ValidationPoolSaturated(RuntimeError):
+    """Raised when the pool already holds max_pending validations"""
+
+
+def fork_available():
+    """Whether this platform supports the 'fork' start method (not on Windows)"""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def _init_worker():
+    # Each worker is one core of parallelism; OpenCV's own threads would oversubscribe
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def _validate_shared(name, shape, file_size, proxy_max_edge, stop_on_error):
+    """Worker entry point: validate an RGB image held in shared memory"""
+    from utils.decoded_image import DecodedImage
+    from utils.image_validation import validate_image_quality
+
+    # Attaching registers the block with the resource tracker; workers use
+    # the parent's tracker (started in ValidationPool.__init__), so this only
+    # repeats the parent's registration and the parent's unlink clears it
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        rgb = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+        image = DecodedImage(rgb, file_size=file_size)
+        result = validate_image_quality(image, proxy_max_edge=proxy_max_edge, stop_on_error=stop_on_error)
+        # Drop every view of the buffer before closing it
+        del image, rgb
+        return result
+    finally:
+        shm.close()
+
+
+class ValidationPool:
+    """
+    Bounded process pool running validate_image_quality
+
+    The decoded RGB buffer is copied once into a shared-memory block that the
+    worker maps directly, so no pixels are pickled. At most max_pending
+    validations are queued or running; further submissions raise
+    ValidationPoolSaturated so the caller can shed load (HTTP 503).
+
+    With the default 'fork' start method every worker is forked once, when
+    the pool is created. Create it before the model is loaded or any
+    threads are started so workers inherit neither. ('spawn' would instead
+    re-import the main module, i.e. app.py, in every worker, so it is only
+    usable from a script with an `if __name__ == "__main__"` guard.)
+    """
+
+    def __init__(self, workers=2, max_pending=8, start_method='fork'):
+        """
+        Args:
+            workers: Number of worker processes
+            max_pending: Maximum validations queued or running at once
+            start_method: multiprocessing start method for the workers
+
+        Raises:
+            ValueError: If start_method is not available on this platform
+                (e.g. 'fork' on Windows)
+        """
+        if start_method not in multiprocessing.get_all_start_methods():
+            raise ValueError(
+                f"ValidationPool start method '{start_method}' is not available on this platform; "
+                f"use one of {multiprocessing.get_all_start_methods()} or validate inline"
+            )
+        self.workers = workers
+        self.max_pending = max_pending
+        if os.name == 'posix':
+            # Start the tracker before forking so workers inherit it instead
+            # of each starting their own, which would warn about (and could
+            # unlink) blocks the parent still owns
+            resource_tracker.ensure_running()
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker
+        )
+        # The first submission starts all forked workers; do it now
+        self._executor.submit(_init_worker).result()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.submitted = 0
+        self.rejected = 0
+
+    def submit(self, image, proxy_max_edge=None, stop_on_error=False):
+        """
+        Start validating a DecodedImage in a worker process
+
+        Returns:
+            concurrent.futures.Future resolving to the validate_image_quality result
+
+        Raises:
+            ValidationPoolSaturated: If max_pending validations are already in flight
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ValidationPoolSaturated('Validation queue is full')
+
+        shm = None
+        try:
+            rgb = image.rgb
+            shm = shared_memory.SharedMemory(create=True, size=max(rgb.nbytes, 1))
+            np.ndarray(rgb.shape, dtype=np.uint8, buffer=shm.buf)[...] = rgb
+            future = self._executor.submit(
+                _validate_shared, shm.name, rgb.shape, image.file_size, proxy_max_edge, stop_on_error
+            )
+        except Exception:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+        future.add_done_callback(lambda _: self._release(shm))
+        return future
+
+    def validate(self, image, proxy_max_edge=None, stop_on_error=False, timeout=None):
+        """Validate in a worker and wait for the result"""
+        return self.submit(image, proxy_max_edge, stop_on_error).result(timeout=timeout)
+
+    def _release(self, shm):
+        shm.close()
+        shm.unlink()
+        with self._lock:
+            self.pending -= 1
+        self._slots.release()
+
+    def get_metrics(self):
+        """Pool size, in-flight validations and backpressure counters"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self.pending,
+                'submitted': self.submitted,
+                'rejected': self.rejected
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)